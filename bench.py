@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+from fixture_server import FIXTURE_DIR, VARIANTS, FixtureCorpus, FixtureServer
+from profiler import DEFAULT_PROFILE_DIR, PROFILERS, profiling
+from race_ids import race_url
+from scraper import (RATE_LIMITER, LazyBrowser, new_browser_context, new_http_session, scrape_page,
+                     scrape_race_http, set_base_url)
+
+
+# Benchmark configurations: (extraction engine, fetch backend)
+CONFIGS = {
+    "dom": ("dom", "browser"),          # per-element Playwright queries
+    "evaluate": ("evaluate", "browser"),  # one page.evaluate per page
+    "html": ("html", "browser"),        # lxml parse of page.content()
+    "http": ("html", "http"),           # lxml parse of plain HTTP responses
+}
+DEFAULT_CONFIGS = ("dom", "evaluate", "html")
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+async def scrape_timed(config: str, urls: List[str], concurrency: int, warmup: int) -> Tuple[list, List[float], float]:
+    """
+    Scrape ``urls`` with one configuration, returning (results, per-race
+    seconds, wall seconds); the first ``warmup`` races (browser launch,
+    connection setup) are scraped but not measured
+    """
+    engine, fetch = CONFIGS[config]
+    browser = LazyBrowser()
+    session = new_http_session(concurrency, concurrency) if fetch == "http" else None
+    results: List[Dict[str, Any]] = []
+    latencies: List[float] = []
+
+    async def worker(queue: asyncio.Queue, measure: bool):
+        context = page = None
+        try:
+            while not queue.empty():
+                url = queue.get_nowait()
+                start = time.perf_counter()
+                try:
+                    if session is not None:
+                        result = await scrape_race_http(url, session, browser, engine)
+                    else:
+                        if page is None:
+                            context = await new_browser_context(await browser.get())
+                            page = await context.new_page()
+                        result = await scrape_page(page, url, engine)
+                except Exception as e:
+                    print(f"Error scraping {url}: {e}", file=sys.stderr)
+                    result = {"race_url": url, "error": str(e)}
+                if measure:
+                    latencies.append(time.perf_counter() - start)
+                    results.append(result)
+        finally:
+            if context is not None:
+                await context.close()
+
+    async def run(batch: List[str], measure: bool):
+        queue: asyncio.Queue = asyncio.Queue()
+        for url in batch:
+            queue.put_nowait(url)
+        await asyncio.gather(*(worker(queue, measure) for _ in range(min(concurrency, len(batch)))))
+
+    try:
+        await run(urls[:warmup], measure=False)
+        start = time.perf_counter()
+        await run(urls[warmup:], measure=True)
+        wall = time.perf_counter() - start
+    finally:
+        if session is not None:
+            await session.close()
+        await browser.close()
+    return results, latencies, wall
+
+
+async def run_single(config: str, urls: List[str], concurrency: int, warmup: int, results_path: str,
+                     profile: Optional[str] = None, profiler: str = "sample") -> Dict[str, Any]:
+    """
+    Benchmark one configuration in this process, writing its results as
+    ndjson (and a profile of the run to the ``profile`` directory if given)
+    """
+    cpu_start = time.process_time()
+    with profiling(profile, profiler, name=f"bench_{config}") if profile else contextlib.nullcontext():
+        results, latencies, wall = await scrape_timed(config, urls, concurrency, warmup)
+    cpu = time.process_time() - cpu_start
+
+    with open(results_path, 'w', encoding='utf-8') as f:
+        for result in results:
+            f.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    # Chromium and the Playwright driver have exited by now, so they count here
+    child_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return {
+        "config": config,
+        "races": len(latencies),
+        "errors": sum(1 for result in results if "error" in result),
+        "wall": wall,
+        "races_per_sec": len(latencies) / wall if wall else None,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "cpu": cpu,
+        "cpu_children": child_usage.ru_utime + child_usage.ru_stime,
+        "peak_rss_mb": self_usage.ru_maxrss / 1024,
+        "peak_rss_children_mb": child_usage.ru_maxrss / 1024,
+    }
+
+
+async def start_fixture_server(args: argparse.Namespace) -> Tuple[web.AppRunner, str, FixtureCorpus]:
+    corpus = FixtureCorpus(args.corpus or [FIXTURE_DIR])
+    server = FixtureServer(corpus, tuple(args.variant or ["plain"]), args.latency / 1000, args.jitter / 1000,
+                           seed=0)
+    runner = web.AppRunner(server.app())
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, f"http://127.0.0.1:{port}", corpus
+
+
+async def run_child(config: str, base_url: str, urls_path: str, results_path: str,
+                    args: argparse.Namespace) -> Optional[Dict[str, Any]]:
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, os.path.abspath(__file__), "--single", config, "--base-url", base_url,
+        "--urls-file", urls_path, "--results-file", results_path,
+        "--concurrency", str(args.concurrency), "--warmup", str(args.warmup),
+        *(["--profile", args.profile, "--profiler", args.profiler] if args.profile else []),
+        stdout=asyncio.subprocess.PIPE,
+    )
+    stdout, _ = await process.communicate()
+    if process.returncode != 0:
+        print(f"{config}: benchmark failed (exit {process.returncode})", file=sys.stderr)
+        return None
+    return json.loads(stdout.decode().strip().splitlines()[-1])
+
+
+def load_results(path: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Successful results of a run by race_url (one race may be scraped several
+    times); failed races are counted in the run's stats instead
+    """
+    results: Dict[str, Dict[str, Any]] = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            result = json.loads(line)
+            if "error" not in result:
+                results.setdefault(result["race_url"], result)
+    return results
+
+
+def compare_outputs(outputs: Dict[str, Dict[str, Dict[str, Any]]]) -> List[str]:
+    """
+    Describe every configuration without a single successful race and every
+    race whose JSON differs from the first other configuration's
+    """
+    problems = [f"{config}: no successful races to compare" for config, results in outputs.items() if not results]
+    compared = {config: results for config, results in outputs.items() if results}
+    if not compared:
+        return problems
+    reference_config, reference = next(iter(compared.items()))
+    for config, results in itertools.islice(compared.items(), 1, None):
+        for url in sorted(set(reference) | set(results)):
+            expected, actual = reference.get(url), results.get(url)
+            if expected is None or actual is None:
+                problems.append(f"{url}: missing from {reference_config if expected is None else config}")
+            elif expected != actual:
+                keys = [key for key in set(expected) | set(actual) if expected.get(key) != actual.get(key)]
+                problems.append(f"{url}: {config} differs from {reference_config} in {', '.join(sorted(keys))}")
+    return problems
+
+
+def format_row(stats: Dict[str, Any]) -> str:
+    def ms(value):
+        return f"{value * 1000:8.1f}" if value is not None else "       -"
+    return (f"{stats['config']:<9} {stats['races']:>5} {stats['errors']:>4} {stats['races_per_sec']:>8.2f} "
+            f"{ms(stats['p50'])} {ms(stats['p95'])} {stats['cpu']:>7.2f} {stats['cpu_children']:>8.2f} "
+            f"{stats['peak_rss_mb']:>8.1f} {stats['peak_rss_children_mb']:>9.1f}")
+
+
+async def run_benchmark(args: argparse.Namespace) -> int:
+    runner = None
+    if args.base_url:
+        base_url = args.base_url
+        race_ids = FixtureCorpus(args.corpus or [FIXTURE_DIR]).race_ids()
+    else:
+        runner, base_url, corpus = await start_fixture_server(args)
+        race_ids = corpus.race_ids()
+    if not race_ids:
+        print("No races in the fixture corpus")
+        return 1
+    urls = [race_url(race_id) for race_id in itertools.islice(itertools.cycle(race_ids), args.races + args.warmup)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        urls_path = os.path.join(tmp, "urls.txt")
+        with open(urls_path, 'w', encoding='utf-8') as f:
+            f.write("\n".join(urls) + "\n")
+
+        rows = []
+        outputs: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        try:
+            # One process per configuration keeps CPU time and peak RSS apart
+            for config in args.engine or DEFAULT_CONFIGS:
+                results_path = os.path.join(tmp, f"{config}.ndjson")
+                stats = await run_child(config, base_url, urls_path, results_path, args)
+                if stats is not None:
+                    rows.append(stats)
+                    outputs[config] = load_results(results_path)
+        finally:
+            if runner is not None:
+                await runner.cleanup()
+
+    print(f"{len(urls) - args.warmup} races ({len(race_ids)} distinct), concurrency {args.concurrency}, "
+          f"latency {args.latency:.0f}+-{args.jitter:.0f} ms")
+    print("config    races  err  races/s   p50 ms   p95 ms  cpu s  child s  rss MB  child MB")
+    for stats in rows:
+        print(format_row(stats))
+
+    problems = compare_outputs(outputs)
+    for problem in problems:
+        print(f"MISMATCH {problem}")
+    compared = [config for config, results in outputs.items() if results]
+    if len(compared) > 1 and not problems:
+        print(f"Output identical across {', '.join(compared)}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({"runs": rows, "mismatches": problems}, f, ensure_ascii=False, indent=2)
+    failed = len(rows) < len(args.engine or DEFAULT_CONFIGS) or any(stats["errors"] for stats in rows)
+    return 1 if problems or failed else 0
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Compare extraction engines on the local fixture corpus")
+    parser.add_argument('--engine', action='append', choices=list(CONFIGS),
+                        help=f"configuration to run, repeatable (default: {', '.join(DEFAULT_CONFIGS)})")
+    parser.add_argument('--races', type=int, default=40, help="measured races per configuration (default: 40)")
+    parser.add_argument('--warmup', type=int, default=2, help="unmeasured races first (default: 2)")
+    parser.add_argument('--concurrency', type=int, default=4, help="races in parallel (default: 4)")
+    parser.add_argument('--latency', type=float, default=0.0, help="fixture server delay in ms (default: 0)")
+    parser.add_argument('--jitter', type=float, default=0.0, help="fixture server delay jitter in ms (default: 0)")
+    parser.add_argument('--variant', action='append', choices=VARIANTS, help="fixture page variant (repeatable)")
+    parser.add_argument('--corpus', action='append', metavar='DIR', help="fixture directory (default: fixtures/)")
+    parser.add_argument('--base-url', help="use an already running fixture server")
+    parser.add_argument('--json', metavar='PATH', help="also write the numbers as JSON")
+    parser.add_argument('--profile', nargs='?', const=DEFAULT_PROFILE_DIR, metavar='DIR',
+                        help=f"profile each configuration's run into DIR (default: {DEFAULT_PROFILE_DIR})")
+    parser.add_argument('--profiler', choices=PROFILERS, default="sample",
+                        help="sample or cprofile, as in scraper.py (default: sample)")
+    # Internal: benchmark one configuration in a child process
+    parser.add_argument('--single', choices=list(CONFIGS), help=argparse.SUPPRESS)
+    parser.add_argument('--urls-file', help=argparse.SUPPRESS)
+    parser.add_argument('--results-file', help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args(sys.argv[1:])
+    if args.single:
+        set_base_url(args.base_url)
+        # Engines are compared at full speed; the fixture server needs no politeness
+        RATE_LIMITER.configure(0)
+        with open(args.urls_file, encoding='utf-8') as f:
+            urls = [line.strip() for line in f if line.strip()]
+        # Progress and error messages must not end up in the stats on stdout
+        stdout = sys.stdout
+        sys.stdout = sys.stderr
+        try:
+            stats = asyncio.run(run_single(args.single, urls, args.concurrency, args.warmup, args.results_file,
+                                           args.profile, args.profiler))
+        finally:
+            sys.stdout = stdout
+        print(json.dumps(stats))
+        return
+    sys.exit(asyncio.run(run_benchmark(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+# Separation of a horse from the one ahead of it in a passing order string
+CLOSE = 0       # "," between groups (or the leader)
+ABREAST = 1     # inside "(...)": side by side with the horse ahead
+GAP = 2         # "-": a clear gap
+WIDE_GAP = 3    # "=": a large gap
+
+MAX_DIGITS = 3
+
+
+def parse_passing_orders(orders: Sequence[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Parse many passing order strings at once
+
+    Returns flat arrays with one entry per horse found: (index into
+    ``orders``, horse number, position, separation). Horses in a "(...)"
+    group run abreast and share the position of the first horse of the
+    group; "-" and "=" mark gaps before the next horse, "*" (the group
+    member slightly ahead) is ignored.
+
+        "14(10,11,8)1-9" -> 14: 1, 10/11/8: 2 (abreast), 1: 5, 9: 6 (gap)
+
+    All strings are tokenized together on their bytes, so a season of
+    corners costs a handful of array operations instead of a Python loop
+    per character.
+    """
+    text = np.frombuffer(";".join(orders).encode("ascii", "replace"), dtype=np.uint8)
+    size = len(text)
+
+    digit = (text >= ord("0")) & (text <= ord("9"))
+    starts = np.flatnonzero(digit & ~np.concatenate(([False], digit[:-1])))
+    count = len(starts)
+
+    numbers = (text[starts] - ord("0")).astype(np.int16)
+    following = starts.copy()
+    more = np.ones(count, dtype=bool)
+    for _ in range(MAX_DIGITS - 1):
+        following += 1
+        more &= following < size
+        more[more] = digit[following[more]]
+        numbers[more] = numbers[more] * 10 + text[following[more]] - ord("0")
+
+    separator = text == ord(";")
+    order_index = np.cumsum(separator)[starts] if size else np.zeros(0, dtype=np.intp)
+
+    # Parenthesis depth relative to the start of each string, so that an
+    # unbalanced string cannot leak into the next one
+    opens = np.cumsum(text == ord("("))
+    depth = opens - np.cumsum(text == ord(")"))
+    base = np.concatenate(([0], depth[separator]))
+    in_group = depth[starts] - base[order_index] > 0
+    group = opens[starts]
+
+    indexes = np.arange(count)
+    first_of_order = np.ones(count, dtype=bool)
+    first_of_order[1:] = order_index[1:] != order_index[:-1]
+    abreast = np.zeros(count, dtype=bool)
+    abreast[1:] = in_group[1:] & in_group[:-1] & (group[1:] == group[:-1]) & ~first_of_order[1:]
+
+    # Position = count within the string, shared by every member of a group
+    order_start = np.maximum.accumulate(np.where(first_of_order, indexes, 0))
+    anchor = np.maximum.accumulate(np.where(abreast, 0, indexes))
+    positions = (anchor - order_start + 1).astype(np.int8)
+
+    # Gap markers between the previous horse and this one
+    dashes = np.cumsum(text == ord("-"))
+    equals = np.cumsum(text == ord("="))
+    previous = np.roll(starts, 1)
+    separations = np.where(equals[starts] > equals[previous], WIDE_GAP,
+                           np.where(dashes[starts] > dashes[previous], GAP, CLOSE)).astype(np.int8)
+    separations[first_of_order] = CLOSE
+    separations[abreast] = ABREAST
+
+    return order_index, numbers, positions, separations
+
+
+def parse_passing_order(order: str, width: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Parse one corner's passing order into (positions, separations) rows,
+    int8 arrays of ``width`` indexed by horse number - 1 (0 = not in the
+    string)
+    """
+    _, numbers, positions, separations = parse_passing_orders([order])
+    position_row = np.zeros(width, dtype=np.int8)
+    separation_row = np.zeros(width, dtype=np.int8)
+    known = (numbers >= 1) & (numbers <= width)
+    position_row[numbers[known] - 1] = positions[known]
+    separation_row[numbers[known] - 1] = separations[known]
+    return position_row, separation_row
+
+
+@dataclass(slots=True)
+class CornerMatrix:
+    """
+    Passing orders of one race as dense (corners x horses) int8 matrices
+
+    Column i is horse number i + 1. ``positions`` is 0 where a horse was
+    not recorded; ``separations`` holds CLOSE, ABREAST, GAP or WIDE_GAP.
+    """
+    corners: np.ndarray         # int8 corner numbers, one per row
+    positions: np.ndarray       # int8 (corners, horses)
+    separations: np.ndarray     # int8 (corners, horses)
+
+    @classmethod
+    def parse(cls, corner_passing_order: Dict[int, str], width: Optional[int] = None) -> "CornerMatrix":
+        """
+        Build from corner number -> passing order strings (empty strings,
+        i.e. corners without a recorded order, are skipped); ``width``
+        defaults to the highest horse number found
+        """
+        return cls.parse_many([corner_passing_order], [width])[0]
+
+    @classmethod
+    def parse_many(cls, corner_passing_orders: Sequence[Dict[int, str]],
+                   widths: Sequence[Optional[int]]) -> List["CornerMatrix"]:
+        """
+        parse() for many races at once: one parse_passing_orders() call, and
+        every race's matrices are views into one buffer filled in one step
+        """
+        recorded = [sorted((corner, order) for corner, order in orders.items() if order)
+                    for orders in corner_passing_orders]
+        rows, numbers, positions, separations = parse_passing_orders(
+            [order for race in recorded for _, order in race])
+
+        counts = np.array([len(race) for race in recorded], dtype=np.intp)
+        first_row = np.concatenate(([0], np.cumsum(counts)))
+        race_of_row = np.repeat(np.arange(len(recorded)), counts)
+        race = race_of_row[rows]
+        if any(width is None for width in widths):
+            highest = np.zeros(len(recorded), dtype=np.intp)
+            np.maximum.at(highest, race, numbers)
+            widths = [int(highest[i]) if width is None else width for i, width in enumerate(widths)]
+        widths = np.array(widths, dtype=np.intp)
+
+        # Race i's (counts[i], widths[i]) matrix starts at offsets[i] of the buffer
+        sizes = counts * widths
+        offsets = np.concatenate(([0], np.cumsum(sizes)))
+        position_buffer = np.zeros(offsets[-1], dtype=np.int8)
+        separation_buffer = np.zeros(offsets[-1], dtype=np.int8)
+        known = (numbers >= 1) & (numbers <= widths[race])
+        cells = offsets[race[known]] + (rows[known] - first_row[race[known]]) * widths[race[known]] + numbers[known] - 1
+        position_buffer[cells] = positions[known]
+        separation_buffer[cells] = separations[known]
+
+        corners = np.array([corner for race in recorded for corner, _ in race], dtype=np.int8)
+        return [cls(corners[first_row[i]:first_row[i + 1]],
+                    position_buffer[offsets[i]:offsets[i + 1]].reshape(counts[i], widths[i]),
+                    separation_buffer[offsets[i]:offsets[i + 1]].reshape(counts[i], widths[i]))
+                for i in range(len(recorded))]
+
+    def for_runners(self, horse_numbers: np.ndarray) -> np.ndarray:
+        """Positions with columns aligned to ``horse_numbers`` (0 for unknown numbers)"""
+        result = np.zeros((len(self.corners), len(horse_numbers)), dtype=np.int8)
+        indexes = horse_numbers.astype(np.intp) - 1
+        known = (indexes >= 0) & (indexes < self.positions.shape[1])
+        result[:, known] = self.positions[:, indexes[known]]
+        return result
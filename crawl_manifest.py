@@ -0,0 +1,106 @@
+import json
+import os
+import time
+from typing import Any, Dict, Optional
+
+
+MANIFEST_NAME = "manifest.jsonl"
+STREAM_MANIFEST_SUFFIX = ".manifest.jsonl"
+
+
+def is_result_complete(result: Dict[str, Any]) -> bool:
+    """A race is complete once it has runners and lap times"""
+    lap_times = result.get("lap_times") or {}
+    return bool(result.get("horses")) and bool(lap_times.get("interval_times"))
+
+
+class CrawlManifest:
+    """
+    Record of which races have already been scraped into an output directory
+
+    The manifest is an append-only JSON-lines file; the last line for a
+    race_id wins. Races missing from it are checked against their
+    race_data_{race_id}.json file once and then recorded, so restarted
+    backfills only fetch races that are missing or incomplete.
+
+    With a ``stream`` (an ndjson file, which writes no per-race files) the
+    manifest lives next to that file instead, as {stream}.manifest.jsonl,
+    and its entries are trusted as long as the stream file is not empty.
+    """
+
+    def __init__(self, output_dir: str, stream: Optional[str] = None):
+        self.output_dir = output_dir
+        self.stream = stream
+        if stream is None:
+            self.path = os.path.join(output_dir, MANIFEST_NAME)
+        else:
+            self.path = stream + STREAM_MANIFEST_SUFFIX
+        self.skipped = 0
+        self._entries: Optional[Dict[str, bool]] = None
+
+    @classmethod
+    def for_stream(cls, stream: str) -> "CrawlManifest":
+        """Manifest of the races appended to the ndjson file ``stream``"""
+        return cls(os.path.dirname(stream) or ".", stream)
+
+    def _load(self) -> Dict[str, bool]:
+        if self._entries is None:
+            self._entries = {}
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except json.JSONDecodeError:
+                            # Partial last line from an interrupted run
+                            continue
+                        self._entries[entry["race_id"]] = entry["complete"]
+            except FileNotFoundError:
+                pass
+        return self._entries
+
+    def _append(self, race_id: str, complete: bool) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({"race_id": race_id, "complete": complete,
+                                "recorded_at": int(time.time())}) + "\n")
+        self._load()[race_id] = complete
+
+    def _stream_has_data(self) -> bool:
+        try:
+            return os.path.getsize(self.stream) > 0
+        except OSError:
+            return False
+
+    def _output_file(self, race_id: str) -> str:
+        return os.path.join(self.output_dir, f"race_data_{race_id}.json")
+
+    def _check_output_file(self, race_id: str) -> Optional[bool]:
+        try:
+            with open(self._output_file(race_id), encoding='utf-8') as f:
+                return is_result_complete(json.load(f))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            return False
+
+    def is_complete(self, race_id: str) -> bool:
+        """True if race_id already has a complete result in the output"""
+        if self.stream is not None:
+            # A deleted or emptied stream takes its races with it
+            complete = self._stream_has_data() and self._load().get(race_id, False)
+        elif race_id in self._load() and os.path.exists(self._output_file(race_id)):
+            complete = self._load()[race_id]
+        else:
+            complete = self._check_output_file(race_id)
+            if complete is None:
+                return False
+            self._append(race_id, complete)
+
+        if complete:
+            self.skipped += 1
+        return complete
+
+    def record(self, result: Dict[str, Any]) -> None:
+        """Record a freshly saved result"""
+        self._append(result.get("race_id", "unknown"), is_result_complete(result))
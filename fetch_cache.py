@@ -0,0 +1,132 @@
+import gzip
+import hashlib
+import os
+import time
+from typing import List, Optional, Tuple
+
+
+DEFAULT_CACHE_DIR = "output/cache"
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+DEFAULT_PROVISIONAL_TTL = 600
+
+
+class FetchCache:
+    """
+    On-disk cache of result page HTML
+
+    Entries are gzip files named after a hash of race type and race_id.
+    Confirmed results never expire; provisional ones are served for
+    ``provisional_ttl`` seconds after they were written. Once the cache
+    grows past ``max_bytes``, the least recently used entries are removed.
+
+    A file's mtime is the time it was written and its atime the time it was
+    last served, so no separate index is needed.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES,
+                 provisional_ttl: float = DEFAULT_PROVISIONAL_TTL):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.provisional_ttl = provisional_ttl
+        self.hits = 0
+        self.misses = 0
+        self._size: Optional[int] = None
+
+    def _path(self, race_type: str, race_id: str, status: str) -> str:
+        key = hashlib.sha1(f"{race_type}:{race_id}".encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], f"{key}.{status}.html.gz")
+
+    def get(self, race_type: str, race_id: str) -> Optional[str]:
+        """Return cached HTML for a race, or None if missing or expired"""
+        for status in ("confirmed", "provisional"):
+            path = self._path(race_type, race_id, status)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+
+            now = time.time()
+            if status == "provisional" and now - stat.st_mtime > self.provisional_ttl:
+                continue
+
+            try:
+                with gzip.open(path, 'rt', encoding='utf-8') as f:
+                    html = f.read()
+            except (OSError, EOFError):
+                # Truncated or corrupt entry, refetch
+                continue
+
+            # Mark as recently used without touching the write time
+            os.utime(path, (now, stat.st_mtime))
+            self.hits += 1
+            return html
+
+        self.misses += 1
+        return None
+
+    def put(self, race_type: str, race_id: str, html: str, confirmed: bool) -> None:
+        """Store HTML for a race, replacing any previous entry"""
+        status = "confirmed" if confirmed else "provisional"
+        path = self._path(race_type, race_id, status)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        for old_status in ("confirmed", "provisional"):
+            self._remove(self._path(race_type, race_id, old_status))
+
+        # Write to a temporary file first so readers never see partial entries
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with gzip.open(tmp_path, 'wt', encoding='utf-8', compresslevel=6) as f:
+            f.write(html)
+        os.replace(tmp_path, path)
+
+        if self._size is not None:
+            self._size += os.path.getsize(path)
+        if self.size() > self.max_bytes:
+            self.evict()
+
+    def _remove(self, path: str) -> None:
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        if self._size is not None:
+            self._size -= size
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".html.gz"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_atime, stat.st_size, path))
+        return entries
+
+    def size(self) -> int:
+        """Total bytes used by cache entries"""
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._entries())
+        return self._size
+
+    def evict(self) -> int:
+        """
+        Remove least recently used entries until the cache is back under
+        90% of its budget, returning the number of entries removed
+        """
+        entries = sorted(self._entries())
+        self._size = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        removed = 0
+
+        for _, _, path in entries:
+            if self._size <= target:
+                break
+            self._remove(path)
+            removed += 1
+
+        return removed
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import glob
+import html
+import json
+import os
+import random
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+from race_ids import race_type_of
+from scraper import extract_race_id, load_html_archive
+
+
+DEFAULT_PORT = 8701
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# plain: as netkeiba serves it; no-tbody: result rows without <tbody>;
+# euc-jp: EUC-JP encoded like the NAR site; late-table: results table
+# inserted by script after LATE_TABLE_MS (not in the server-rendered HTML);
+# provisional: no lap times yet; no-result: page without a race header or
+# any results (a race not run yet, or no such race)
+VARIANTS = ("plain", "no-tbody", "euc-jp", "late-table", "provisional", "no-result")
+LATE_TABLE_MS = 300
+
+
+def short_venue(venue: str) -> str:
+    return venue[:-len("競馬場")] if venue.endswith("競馬場") else venue
+
+
+def render_title(result: Dict[str, Any]) -> str:
+    race_info = result.get("race_info", {})
+    if "page_title" in race_info:
+        return race_info["page_title"]
+
+    title = f"{race_info.get('race_name', '')} 結果・払戻 |"
+    if race_info.get("race_date"):
+        year, month, day = race_info["race_date"].split("/")
+        title += f" {year}年{int(month)}月{int(day)}日"
+        if race_info.get("venue") and race_info.get("race_number"):
+            title += f" {short_venue(race_info['venue'])}{race_info['race_number']}R"
+    return title + (" 地方競馬レース情報" if result.get("race_type") == "nar" else " レース情報(JRA)")
+
+
+def render_horse_row(horse: Dict[str, str], race_type: str) -> str:
+    def text(key):
+        return html.escape(horse.get(key, ""))
+
+    cells = [
+        f'<td class="Result_Num"><div class="Rank">{text("rank")}</div></td>',
+        f'<td class="Num Waku{text("frame")}"><div>{text("frame")}</div></td>',
+        f'<td class="Num Txt_C"><div>{text("horse_number")}</div></td>',
+        f'<td class="Horse_Info"><span class="Horse_Name"><a href="#">{text("horse_name")}</a></span></td>',
+        '<td class="Barei Txt_C"></td>',
+        '<td class="Txt_C"></td>',
+        '<td class="Jockey"></td>',
+        f'<td class="Time"><span class="RaceTime">{text("time")}</span></td>',
+        '<td class="Time"></td>',
+        '<td class="Odds Txt_C"></td>',
+        '<td class="Odds Txt_R"></td>',
+        f'<td class="Time">{text("last_3f")}</td>',
+    ]
+    if race_type == "jra":
+        cells.append(f'<td class="PassageRate"><div class="PassageRate">{text("corner_passage")}</div></td>')
+    cells += ['<td class="Trainer"></td>', '<td class="Weight"></td>']
+    return '<tr class="HorseList">' + "".join(cells) + '</tr>'
+
+
+def render_results_table(result: Dict[str, Any], tbody: bool = True) -> str:
+    race_type = result.get("race_type")
+    classes = "RaceTable01 RaceCommon_Table ResultRefund" + (" ResultMain" if race_type == "nar" else "")
+    headers = ["着順", "枠", "馬番", "馬名", "性齢", "斤量", "騎手", "タイム", "着差", "人気", "単勝オッズ", "後3F"]
+    if race_type == "jra":
+        headers.append("コーナー通過順")
+    headers += ["厩舎", "馬体重"]
+
+    rows = "\n".join(render_horse_row(horse, race_type) for horse in result.get("horses", []))
+    if tbody:
+        rows = f"<tbody>\n{rows}\n</tbody>"
+    head = '<thead><tr class="Header">' + "".join(f"<th>{h}</th>" for h in headers) + "</tr></thead>"
+    return f'<table class="{classes}">\n{head}\n{rows}\n</table>'
+
+
+def render_result_page(result: Dict[str, Any], variant: str = "plain", charset: str = "UTF-8") -> str:
+    """
+    Render a result dict as a netkeiba result page that the extractors read
+    back into the same dict (minus what the variant leaves out)
+    """
+    if variant == "no-result":
+        # Not run yet or no such race: the page frame without a race header
+        result = {"race_type": result.get("race_type")}
+    race_info = result.get("race_info", {})
+    parts = [f'<html><head><meta charset="{charset}"><title>{html.escape(render_title(result))}</title></head><body>']
+
+    if race_info.get("race_number"):
+        parts.append(f'<div class="RaceList_Item01"><span class="RaceNum">{race_info["race_number"]}R</span></div>')
+    if "race_name" in race_info:
+        parts.append(f'<div class="RaceName">{html.escape(race_info["race_name"])}</div>')
+
+    data01 = []
+    if race_info.get("distance"):
+        data01.append(f'<span>{race_info["distance"]}</span> (右) / 天候:晴 ')
+    if race_info.get("track_condition"):
+        data01.append(f'<span>{race_info["track_condition"]}</span>')
+    if race_info.get("surface_condition"):
+        data01.append(f'<span class="Item03">/ 馬場:{race_info["surface_condition"]}</span>')
+    parts.append(f'<div class="RaceData01">{"".join(data01)}</div>')
+
+    data02 = []
+    if race_info.get("venue"):
+        data02.append(f'<span>{short_venue(race_info["venue"])}</span>')
+    if race_info.get("race_class"):
+        data02.append(f'<span>{html.escape(race_info["race_class"])}</span>')
+    parts.append(f'<div class="RaceData02">{"".join(data02)}</div>')
+
+    if variant == "late-table":
+        table = render_results_table(result)
+        parts.append('<div id="ResultTable"></div>')
+        parts.append(f'<script>setTimeout(() => {{ document.getElementById("ResultTable").innerHTML = '
+                     f'{json.dumps(table)}; }}, {LATE_TABLE_MS});</script>')
+    elif variant != "no-result":
+        parts.append(render_results_table(result, tbody=variant != "no-tbody"))
+
+    corners = result.get("corner_passing_order", {})
+    if corners:
+        rows = "".join(f'<tr><th><strong>{key.replace("corner_", "")}</strong>コーナー</th>'
+                       f'<td>{html.escape(order)}</td></tr>' for key, order in corners.items())
+        parts.append(f'<table class="Corner_Num"><tbody>{rows}</tbody></table>')
+
+    lap_times = result.get("lap_times", {})
+    if lap_times.get("distances") and variant != "provisional":
+        rows = ['<tr class="Header">' + "".join(f"<th>{d}</th>" for d in lap_times["distances"]) + "</tr>",
+                '<tr class="HaronTime">' + "".join(f"<td>{t}</td>" for t in lap_times["cumulative_times"]) + "</tr>"]
+        if "interval_times" in lap_times:
+            rows.append('<tr class="HaronTime">' + "".join(f"<td>{t}</td>" for t in lap_times["interval_times"])
+                        + "</tr>")
+        parts.append(f'<table class="Race_HaronTime"><tbody>{"".join(rows)}</tbody></table>')
+
+    parts.append("</body></html>")
+    return "\n".join(parts)
+
+
+class FixtureCorpus:
+    """
+    Races the stand-in server knows: result dicts (race_data_*.json, rendered
+    on request) and recorded pages (race_data_*.html.gz archives written by
+    scraper.py --archive, served as recorded)
+    """
+
+    def __init__(self, dirs: List[str]):
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self.pages: Dict[str, str] = {}
+        for directory in dirs:
+            for path in sorted(glob.glob(os.path.join(directory, "race_data_*.json"))):
+                with open(path, encoding='utf-8') as f:
+                    result = json.load(f)
+                self.results[result["race_id"]] = result
+            for path in sorted(glob.glob(os.path.join(directory, "race_data_*.html.gz"))):
+                url, page = load_html_archive(path)
+                self.pages[extract_race_id(url)] = page
+
+    def __len__(self) -> int:
+        return len(set(self.results) | set(self.pages))
+
+    def race_ids(self) -> List[str]:
+        return sorted(set(self.results) | set(self.pages))
+
+    def stand_in(self, race_id: str) -> Optional[str]:
+        """A known race of the same race type to serve for an unknown race_id"""
+        race_type = race_type_of(race_id)
+        candidates = sorted(known for known in set(self.results) | set(self.pages)
+                            if race_type_of(known) == race_type)
+        if not candidates:
+            return None
+        return candidates[zlib.crc32(race_id.encode()) % len(candidates)]
+
+
+class FixtureServer:
+    """
+    Serves result pages at /{host}/race/result.html?race_id=... , the layout
+    scraper.py requests when pointed at it with --base-url
+
+    Each response is delayed by ``latency`` +- ``jitter`` seconds, fails
+    with ``error_status`` at ``error_rate``, and uses one of ``variants``
+    (fixed per race_id, so every engine sees the same page).
+    """
+
+    def __init__(self, corpus: FixtureCorpus, variants: Tuple[str, ...] = ("plain",), latency: float = 0.0,
+                 jitter: float = 0.0, error_rate: float = 0.0, error_status: int = 503,
+                 any_race: bool = False, seed: Optional[int] = None):
+        self.corpus = corpus
+        self.variants = variants
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.any_race = any_race
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.errors = 0
+
+    def variant_of(self, race_id: str) -> str:
+        return self.variants[zlib.crc32(race_id.encode()) % len(self.variants)]
+
+    async def handle_result(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        delay = self.latency + self.random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.random.random() < self.error_rate:
+            self.errors += 1
+            return web.Response(status=self.error_status, text=f"HTTP {self.error_status}")
+
+        race_id = request.query.get("race_id", "")
+        known = race_id if race_id in self.corpus.results or race_id in self.corpus.pages else None
+        if known is None and self.any_race and race_id.isdigit() and len(race_id) == 12:
+            known = self.corpus.stand_in(race_id)
+        if known is None:
+            raise web.HTTPNotFound(text=f"Unknown race_id {race_id!r}")
+
+        if known in self.corpus.pages:
+            return web.Response(text=self.corpus.pages[known], content_type="text/html", charset="utf-8")
+
+        variant = self.variant_of(race_id)
+        if variant == "euc-jp":
+            page = render_result_page(self.corpus.results[known], charset="EUC-JP")
+            return web.Response(body=page.encode("euc_jis_2004", errors="xmlcharrefreplace"),
+                                content_type="text/html", charset="EUC-JP")
+        page = render_result_page(self.corpus.results[known], variant)
+        return web.Response(text=page, content_type="text/html", charset="utf-8")
+
+    async def handle_index(self, request: web.Request) -> web.Response:
+        """GET / : known race_ids and request counters"""
+        return web.json_response({"race_ids": self.corpus.race_ids(), "variants": list(self.variants),
+                                  "requests": self.requests, "errors": self.errors})
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/", self.handle_index)
+        app.router.add_get("/{host}/race/result.html", self.handle_result)
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for netkeiba result pages")
+    parser.add_argument('--host', default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f"TCP port (default: {DEFAULT_PORT})")
+    parser.add_argument('--corpus', action='append', metavar='DIR',
+                        help="directory of race_data_*.json / race_data_*.html.gz files "
+                             "(repeatable, default: fixtures/)")
+    parser.add_argument('--variant', action='append', choices=VARIANTS, metavar='NAME',
+                        help=f"page variant, repeat to mix per race_id: {', '.join(VARIANTS)} (default: plain)")
+    parser.add_argument('--latency', type=float, default=0.0, help="response delay in ms (default: 0)")
+    parser.add_argument('--jitter', type=float, default=0.0, help="random +- delay in ms (default: 0)")
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help="fraction of requests answered with --error-status (default: 0)")
+    parser.add_argument('--error-status', type=int, default=503, help="status of failed requests (default: 503)")
+    parser.add_argument('--any-race', action='store_true',
+                        help="serve a known race of the same type for unknown race_ids instead of 404")
+    parser.add_argument('--seed', type=int, help="random seed for latency jitter and errors")
+    args = parser.parse_args()
+
+    corpus = FixtureCorpus(args.corpus or [FIXTURE_DIR])
+    if not len(corpus):
+        parser.error("no race_data_*.json or race_data_*.html.gz files in the corpus")
+    server = FixtureServer(corpus, tuple(args.variant or ["plain"]), args.latency / 1000, args.jitter / 1000,
+                           args.error_rate, args.error_status, args.any_race, args.seed)
+    print(f"Serving {len(corpus)} races; scrape with --base-url http://{args.host}:{args.port}")
+    web.run_app(server.app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+import os
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Deque, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+
+MIN_SAMPLES = 20
+TIMEOUT_FACTOR = 3
+
+# Histogram bucket upper bounds in seconds (Prometheus "le" labels)
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+METRIC_NAME = "netkeiba_scrape_stage_seconds"
+
+T = TypeVar("T")
+
+# Timing record of the race being scraped in the current task (None = off);
+# tasks spawned while scraping it (asyncio.gather) share the same dict
+_race_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("race_timings", default=None)
+
+
+class LatencyStats:
+    """
+    Rolling latency samples per scraping stage
+
+    Keeps the last ``max_samples`` durations (in seconds) of each stage and
+    derives timeouts from them, so waits follow what the site actually does
+    instead of fixed worst-case values.
+    """
+
+    def __init__(self, max_samples: int = 1000):
+        self.max_samples = max_samples
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def record(self, stage: str, seconds: float) -> None:
+        if stage not in self._samples:
+            self._samples[stage] = deque(maxlen=self.max_samples)
+        self._samples[stage].append(seconds)
+
+    def percentile(self, stage: str, q: float) -> Optional[float]:
+        """q-th percentile (0-100) of a stage, or None without samples"""
+        samples = sorted(self._samples.get(stage, ()))
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(q / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def timeout(self, stage: str, default: float, floor: float, ceiling: float) -> float:
+        """
+        Timeout in seconds for a stage: ``default`` until MIN_SAMPLES have
+        been recorded, then TIMEOUT_FACTOR x p99 clamped to [floor, ceiling]
+        """
+        if len(self._samples.get(stage, ())) < MIN_SAMPLES:
+            return default
+        return min(ceiling, max(floor, self.percentile(stage, 99) * TIMEOUT_FACTOR))
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """count/p50/p90/p99/max per stage"""
+        return {
+            stage: {
+                "count": len(samples),
+                "p50": self.percentile(stage, 50),
+                "p90": self.percentile(stage, 90),
+                "p99": self.percentile(stage, 99),
+                "max": max(samples),
+            }
+            for stage, samples in self._samples.items() if samples
+        }
+
+    def format_summary(self) -> str:
+        lines = []
+        for stage, stats in self.summary().items():
+            lines.append(f"{stage}: n={stats['count']} p50={stats['p50']:.2f}s "
+                         f"p90={stats['p90']:.2f}s p99={stats['p99']:.2f}s max={stats['max']:.2f}s")
+        return "\n".join(lines)
+
+
+@contextmanager
+def race_timings() -> Iterator[Dict[str, float]]:
+    """
+    Collect the stage() timings of everything run inside the block into the
+    yielded dict (stage -> seconds)
+    """
+    timings: Dict[str, float] = {}
+    token = _race_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _race_timings.reset(token)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a block as stage ``name`` of the current race (no-op outside race_timings())"""
+    timings = _race_timings.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
+
+async def timed(name: str, awaitable: Awaitable[T]) -> T:
+    """Await ``awaitable`` as stage ``name``, e.g. one branch of an asyncio.gather()"""
+    with stage(name):
+        return await awaitable
+
+
+class StageHistogram:
+    """
+    Fixed-bucket histograms of per-race stage timings
+
+    Unlike LatencyStats it keeps every race of a batch (as bucket counts),
+    for a summary at the end and for Prometheus' text exposition format.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = STAGE_BUCKETS):
+        self.buckets = buckets
+        self.races = 0
+        self._counts: Dict[str, List[int]] = {}
+        self._sums: Dict[str, float] = {}
+
+    def add(self, timings: Dict[str, float]) -> None:
+        """Count one race's timing record"""
+        self.races += 1
+        for name, seconds in timings.items():
+            if name not in self._counts:
+                # The last bucket is +Inf
+                self._counts[name] = [0] * (len(self.buckets) + 1)
+                self._sums[name] = 0.0
+            self._counts[name][bisect_left(self.buckets, seconds)] += 1
+            self._sums[name] += seconds
+
+    def bucket_bound(self, name: str, q: float) -> float:
+        """Upper bound of the bucket holding the q-th percentile (0-100) of a stage"""
+        counts = self._counts[name]
+        rank = q / 100 * sum(counts)
+        seen = 0
+        for index, count in enumerate(counts):
+            seen += count
+            if count and seen >= rank:
+                return self.buckets[index] if index < len(self.buckets) else float("inf")
+        return float("inf")
+
+    def format_summary(self) -> str:
+        """One line per stage with bucketed p50/p95 and the non-empty buckets"""
+        lines = []
+        for name, counts in self._counts.items():
+            total = sum(counts)
+            lines.append(f"{name}: n={total} mean={self._sums[name] / total:.3f}s "
+                         f"p50<={self.bucket_bound(name, 50):g}s p95<={self.bucket_bound(name, 95):g}s")
+            width = max(counts)
+            for index, count in enumerate(counts):
+                if count:
+                    if index < len(self.buckets):
+                        bound = f"<={self.buckets[index]:g}s"
+                    else:
+                        bound = f">{self.buckets[-1]:g}s"
+                    lines.append(f"  {bound:>8} {count:>6} {'#' * max(1, round(count / width * 40))}")
+        return "\n".join(lines)
+
+    def prometheus_text(self) -> str:
+        """The histograms in Prometheus' text exposition format"""
+        lines = [
+            f"# HELP {METRIC_NAME} Time spent in each scraping stage per race.",
+            f"# TYPE {METRIC_NAME} histogram",
+        ]
+        for name, counts in self._counts.items():
+            cumulative = 0
+            for index, count in enumerate(counts):
+                cumulative += count
+                bound = f"{self.buckets[index]:g}" if index < len(self.buckets) else "+Inf"
+                lines.append(f'{METRIC_NAME}_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'{METRIC_NAME}_sum{{stage="{name}"}} {self._sums[name]:.6f}')
+            lines.append(f'{METRIC_NAME}_count{{stage="{name}"}} {cumulative}')
+        lines += [
+            "# HELP netkeiba_scrape_races_timed Races with a timing record.",
+            "# TYPE netkeiba_scrape_races_timed gauge",
+            f"netkeiba_scrape_races_timed {self.races}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str) -> None:
+        """
+        Write prometheus_text() to ``path`` atomically, so a textfile
+        collector never reads a half-written file
+        """
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
@@ -0,0 +1,120 @@
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+
+PACE_TYPES = ("ハイ", "ミドル", "スロー")
+HIGH, MIDDLE, SLOW = range(len(PACE_TYPES))
+
+# First half this many seconds faster (slower) than the second -> ハイ (スロー)
+PACE_MARGIN = 1.0
+
+SEGMENT_M = 200
+
+
+def decode_times(texts: Sequence[str]) -> np.ndarray:
+    """Lap/race times to float32 seconds: ["12.3", "1:01.5"] -> [12.3, 61.5] (NaN if unreadable)"""
+    values: List[float] = []
+    for text in texts:
+        minutes, _, seconds = (text or "").strip().rpartition(":")
+        try:
+            values.append(int(minutes or 0) * 60 + float(seconds))
+        except ValueError:
+            values.append(float("nan"))
+    return np.array(values, dtype=np.float32)
+
+
+def decode_distances(texts: Sequence[str]) -> np.ndarray:
+    """Lap distances to int16 metres: ["200m", "400m"] -> [200, 400] (0 if unreadable)"""
+    distances = []
+    for text in texts:
+        text = (text or "").strip().rstrip("m")
+        distances.append(int(text) if text.isdigit() else 0)
+    return np.array(distances, dtype=np.int16)
+
+
+def decode_lap_times(lap_times: Dict[str, List[str]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(distances, cumulative, intervals) arrays from a result's lap_times"""
+    return (decode_distances(lap_times.get("distances", [])),
+            decode_times(lap_times.get("cumulative_times", [])),
+            decode_times(lap_times.get("interval_times", [])))
+
+
+def lap_matrix(races: Sequence[Any]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Lap distances and cumulative times of many Race objects as (races x
+    laps) matrices, padded with 0 m / NaN
+    """
+    width = max((len(race.lap_cumulative) for race in races), default=0)
+    distances = np.zeros((len(races), width), dtype=np.int16)
+    cumulative = np.full((len(races), width), np.nan, dtype=np.float32)
+    for i, race in enumerate(races):
+        laps = min(len(race.lap_distances_m), len(race.lap_cumulative))
+        distances[i, :laps] = race.lap_distances_m[:laps]
+        cumulative[i, :laps] = race.lap_cumulative[:laps]
+    return distances, cumulative
+
+
+def pace_features(distances: np.ndarray, cumulative: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Pace features for every row of lap_matrix()
+
+    - first_half, second_half: seconds for each half of the race distance
+      (the split is interpolated when it falls inside a lap)
+    - balance: first_half - second_half (negative = faster early)
+    - fastest_lap: index of the fastest lap (-1 without laps), comparing
+      laps as seconds per 200 m so a short first lap is not favoured
+    - fastest_lap_end_m: distance at the end of that lap
+    - fastest_lap_pace: its seconds per 200 m
+    - pace_type: index into PACE_TYPES (-1 without laps)
+    """
+    races, width = distances.shape
+    features = {
+        "first_half": np.full(races, np.nan, dtype=np.float32),
+        "second_half": np.full(races, np.nan, dtype=np.float32),
+        "balance": np.full(races, np.nan, dtype=np.float32),
+        "fastest_lap": np.full(races, -1, dtype=np.int8),
+        "fastest_lap_end_m": np.zeros(races, dtype=np.int16),
+        "fastest_lap_pace": np.full(races, np.nan, dtype=np.float32),
+        "pace_type": np.full(races, -1, dtype=np.int8),
+    }
+    if not races or not width:
+        return features
+
+    # Prepend the start (0 m at 0 s) so every lap has a previous point
+    d = np.concatenate([np.zeros((races, 1)), distances.astype(np.float64)], axis=1)
+    t = np.concatenate([np.zeros((races, 1)), cumulative.astype(np.float64)], axis=1)
+    valid = (d[:, 1:] > 0) & ~np.isnan(t[:, 1:])
+    has_laps = valid.any(axis=1)
+    rows = np.arange(races)
+
+    last = valid.sum(axis=1)
+    total_distance = d[rows, last]
+    total_time = t[rows, last]
+
+    # Cumulative time at half distance, interpolated within its lap
+    half = total_distance / 2
+    after = np.argmax((d[:, 1:] >= half[:, None]) & valid, axis=1) + 1
+    d0, d1 = d[rows, after - 1], d[rows, after]
+    t0, t1 = t[rows, after - 1], t[rows, after]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        first_half = t0 + (t1 - t0) * (half - d0) / (d1 - d0)
+        lengths = np.diff(d, axis=1)
+        segment_pace = np.where(valid & (lengths > 0), np.diff(t, axis=1) / lengths * SEGMENT_M, np.inf)
+    second_half = total_time - first_half
+    balance = first_half - second_half
+    fastest = np.argmin(segment_pace, axis=1)
+
+    pace_type = np.full(races, MIDDLE, dtype=np.int8)
+    pace_type[balance < -PACE_MARGIN] = HIGH
+    pace_type[balance > PACE_MARGIN] = SLOW
+
+    features["first_half"][has_laps] = first_half[has_laps]
+    features["second_half"][has_laps] = second_half[has_laps]
+    features["balance"][has_laps] = balance[has_laps]
+    features["fastest_lap"][has_laps] = fastest[has_laps]
+    features["fastest_lap_end_m"][has_laps] = d[rows, fastest + 1][has_laps]
+    features["fastest_lap_pace"][has_laps] = segment_pace[rows, fastest][has_laps]
+    features["pace_type"][has_laps] = pace_type[has_laps]
+    return features
+
@@ -0,0 +1,167 @@
+import os
+import time
+from typing import Any, Dict, List
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from race_values import parse_distance, parse_float, parse_int, parse_race_date, parse_time_seconds
+
+
+PARTITION_COLUMNS = ["year", "venue", "race_type"]
+
+PARTITIONING = ds.partitioning(
+    pa.schema([("year", pa.int16()), ("venue", pa.string()), ("race_type", pa.string())]),
+    flavor="hive",
+)
+
+RACE_KEY_FIELDS = [
+    ("race_id", pa.string()),
+    ("race_date", pa.date32()),
+    ("year", pa.int16()),
+    ("venue", pa.string()),
+    ("race_type", pa.string()),
+    ("race_number", pa.int8()),
+]
+
+# One row per runner
+RUNNER_SCHEMA = pa.schema(RACE_KEY_FIELDS + [
+    ("surface", pa.string()),
+    ("distance_m", pa.int16()),
+    ("surface_condition", pa.string()),
+    ("rank", pa.int8()),
+    ("frame", pa.int8()),
+    ("horse_number", pa.int8()),
+    ("horse_name", pa.string()),
+    ("time_seconds", pa.float32()),
+    ("last_3f", pa.float32()),
+    ("corner_passage", pa.string()),
+])
+
+# One row per race
+RACE_SCHEMA = pa.schema(RACE_KEY_FIELDS + [
+    ("race_name", pa.string()),
+    ("race_class", pa.string()),
+    ("surface", pa.string()),
+    ("distance_m", pa.int16()),
+    ("track_condition", pa.string()),
+    ("surface_condition", pa.string()),
+    ("field_size", pa.int8()),
+    ("corner_passing_order", pa.map_(pa.string(), pa.string())),
+    ("lap_distances_m", pa.list_(pa.int16())),
+    ("lap_cumulative_seconds", pa.list_(pa.float32())),
+    ("lap_interval_seconds", pa.list_(pa.float32())),
+])
+
+
+def race_key(result: Dict[str, Any]) -> Dict[str, Any]:
+    race_info = result.get("race_info", {})
+    race_date = parse_race_date(race_info.get("race_date"))
+    return {
+        "race_id": result.get("race_id"),
+        "race_date": race_date,
+        "year": race_date.year if race_date else parse_int(str(result.get("race_id", ""))[:4]),
+        "venue": race_info.get("venue") or "unknown",
+        "race_type": result.get("race_type") or "unknown",
+        "race_number": parse_int(race_info.get("race_number")),
+    }
+
+
+def runner_rows(result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    race_info = result.get("race_info", {})
+    key = race_key(result)
+    surface, distance_m = parse_distance(race_info.get("distance"))
+
+    return [dict(key, **{
+        "surface": surface,
+        "distance_m": distance_m,
+        "surface_condition": race_info.get("surface_condition"),
+        "rank": parse_int(horse.get("rank")),
+        "frame": parse_int(horse.get("frame")),
+        "horse_number": parse_int(horse.get("horse_number")),
+        "horse_name": horse.get("horse_name"),
+        "time_seconds": parse_time_seconds(horse.get("time")),
+        "last_3f": parse_float(horse.get("last_3f")),
+        "corner_passage": horse.get("corner_passage"),
+    }) for horse in result.get("horses", [])]
+
+
+def race_row(result: Dict[str, Any]) -> Dict[str, Any]:
+    race_info = result.get("race_info", {})
+    lap_times = result.get("lap_times", {})
+    surface, distance_m = parse_distance(race_info.get("distance"))
+
+    return dict(race_key(result), **{
+        "race_name": race_info.get("race_name"),
+        "race_class": race_info.get("race_class"),
+        "surface": surface,
+        "distance_m": distance_m,
+        "track_condition": race_info.get("track_condition"),
+        "surface_condition": race_info.get("surface_condition"),
+        "field_size": len(result.get("horses", [])),
+        "corner_passing_order": list(result.get("corner_passing_order", {}).items()),
+        "lap_distances_m": [parse_int(d.rstrip("m")) for d in lap_times.get("distances", [])],
+        "lap_cumulative_seconds": [parse_time_seconds(t) for t in lap_times.get("cumulative_times", [])],
+        "lap_interval_seconds": [parse_time_seconds(t) for t in lap_times.get("interval_times", [])],
+    })
+
+
+class ParquetSink:
+    """
+    Append scraped races to partitioned Parquet datasets
+
+    Writes ``{root}/runners`` (one row per runner) and ``{root}/races``
+    (one row per race), hive-partitioned by year/venue/race_type. Races are
+    buffered and written as a new part file per partition on every flush, so
+    a dataset only ever grows; a race scraped twice appears twice and
+    readers should deduplicate on race_id.
+
+    Read back with e.g.
+        ds.dataset("out/runners", partitioning="hive").to_table(
+            columns=["venue", "frame", "rank"], filter=ds.field("year") == 2025)
+    """
+
+    def __init__(self, root: str, flush_every: int = 500):
+        self.root = root
+        self.flush_every = flush_every
+        self._runners: List[Dict[str, Any]] = []
+        self._races: List[Dict[str, Any]] = []
+        self._pending = 0
+        self._flushes = 0
+
+    def add(self, result: Dict[str, Any]) -> None:
+        self._runners.extend(runner_rows(result))
+        self._races.append(race_row(result))
+        self._pending += 1
+        if self._pending >= self.flush_every:
+            self.flush()
+
+    def _write(self, name: str, rows: List[Dict[str, Any]], schema: pa.Schema) -> None:
+        if not rows:
+            return
+        ds.write_dataset(
+            pa.Table.from_pylist(rows, schema=schema),
+            os.path.join(self.root, name),
+            format="parquet",
+            partitioning=PARTITIONING,
+            # Unique per flush so earlier part files are never overwritten
+            basename_template=f"part-{int(time.time() * 1000)}-{os.getpid()}-{self._flushes}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+        )
+
+    def flush(self) -> None:
+        self._write("runners", self._runners, RUNNER_SCHEMA)
+        self._write("races", self._races, RACE_SCHEMA)
+        self._runners = []
+        self._races = []
+        self._pending = 0
+        self._flushes += 1
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,188 @@
+import asyncio
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterator, List, Optional, Tuple
+
+
+PROFILERS = ("sample", "cprofile")
+DEFAULT_PROFILE_DIR = "profiles"
+DEFAULT_INTERVAL = 0.005
+TOP_FUNCTIONS = 25
+
+# Root frames of the collapsed stacks
+CPU_ROOT = "cpu"
+AWAIT_ROOT = "await"
+
+
+def frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)})"
+
+
+def thread_stack(frame) -> List[str]:
+    """Labels of a thread's frames, outermost first"""
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+def coroutine_stack(coroutine) -> List[str]:
+    """Labels of a suspended coroutine and everything it awaits, outermost first"""
+    labels = []
+    while coroutine is not None:
+        frame = getattr(coroutine, "cr_frame", None) or getattr(coroutine, "gi_frame", None)
+        if frame is None:
+            # A Future or a finished coroutine: the end of the chain
+            break
+        labels.append(frame_label(frame))
+        coroutine = getattr(coroutine, "cr_await", None) or getattr(coroutine, "gi_yieldfrom", None)
+    return labels
+
+
+def is_idle(frame) -> bool:
+    """True if the event loop thread is blocked waiting for I/O or timers"""
+    return (frame is not None and frame.f_code.co_name in ("select", "poll", "control")
+            and os.path.basename(frame.f_code.co_filename) == "selectors.py")
+
+
+class StackSampler:
+    """
+    Sampling profiler for the thread running the event loop
+
+    A background thread looks at the loop thread's stack every
+    ``interval`` seconds. Samples taken while Python code runs are CPU
+    samples and count that stack. When the loop is idle in select(), the
+    sample counts as await time for every pending task instead, under the
+    chain of coroutines it is suspended in (e.g. scrape_page -> goto), so
+    network and wait time never shows up as CPU hot spots.
+    """
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.cpu_samples = 0
+        self.idle_samples = 0
+        self._thread_id = threading.get_ident()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        try:
+            self._loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._loop = None
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                continue
+            if not is_idle(frame) or self._loop is None:
+                self.cpu_samples += 1
+                self.stacks[(CPU_ROOT,) + tuple(thread_stack(frame))] += 1
+                continue
+            self.idle_samples += 1
+            try:
+                tasks = list(asyncio.all_tasks(self._loop))
+            except RuntimeError:
+                # The task set changed while it was being copied
+                continue
+            for task in tasks:
+                stack = coroutine_stack(task.get_coro())
+                if stack:
+                    self.stacks[(AWAIT_ROOT,) + tuple(stack)] += 1
+
+    def collapsed(self) -> str:
+        """Stacks in the collapsed format of flamegraph.pl, speedscope and inferno"""
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in sorted(self.stacks.items()))
+
+    def top_functions(self, root: str, limit: int = TOP_FUNCTIONS) -> Tuple[Counter, Counter]:
+        """(self, inclusive) sample counts per function under ``root``"""
+        own: Counter = Counter()
+        inclusive: Counter = Counter()
+        for stack, count in self.stacks.items():
+            if stack[0] != root or len(stack) < 2:
+                continue
+            own[stack[-1]] += count
+            for label in set(stack[1:]):
+                inclusive[label] += count
+        return own, inclusive
+
+
+def format_report(sampler: StackSampler, wall: float, cpu: float) -> str:
+    lines = [
+        f"wall {wall:.2f}s, process CPU {cpu:.2f}s, await (loop idle) ~{sampler.idle_samples * sampler.interval:.2f}s",
+        f"samples: {sampler.cpu_samples} cpu, {sampler.idle_samples} idle (every {sampler.interval * 1000:g} ms)",
+    ]
+    for root, title in ((CPU_ROOT, "CPU"), (AWAIT_ROOT, "await, summed over pending tasks")):
+        own, inclusive = sampler.top_functions(root)
+        total = sum(count for stack, count in sampler.stacks.items() if stack[0] == root) or 1
+        lines.append("")
+        lines.append(f"{title}: self / inclusive samples")
+        for label, count in own.most_common(TOP_FUNCTIONS):
+            lines.append(f"  {count:>7} {count / total:6.1%} {inclusive[label]:>7}  {label}")
+    return "\n".join(lines) + "\n"
+
+
+@contextmanager
+def profiling(output_dir: str = DEFAULT_PROFILE_DIR, profiler: str = "sample", name: str = "scrape",
+              interval: float = DEFAULT_INTERVAL) -> Iterator[str]:
+    """
+    Profile the block and write the results to ``output_dir``
+
+    Always samples stacks (see StackSampler) and writes
+    {name}_{timestamp}.collapsed plus a {name}_{timestamp}.txt report.
+    With ``profiler="cprofile"`` the block also runs under cProfile timed
+    by process CPU time (await time excluded), saved as .prof for pstats or
+    snakeviz. Yields the path prefix of the files.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    prefix = os.path.join(output_dir, f"{name}_{datetime.now():%Y%m%d-%H%M%S}_{os.getpid()}")
+    sampler = StackSampler(interval)
+    cpu_profile = cProfile.Profile(time.process_time) if profiler == "cprofile" else None
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+
+    sampler.start()
+    if cpu_profile is not None:
+        cpu_profile.enable()
+    try:
+        yield prefix
+    finally:
+        if cpu_profile is not None:
+            cpu_profile.disable()
+        sampler.stop()
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+
+        with open(f"{prefix}.collapsed", 'w', encoding='utf-8') as f:
+            f.write(sampler.collapsed())
+        report = format_report(sampler, wall, cpu)
+        if cpu_profile is not None:
+            cpu_profile.dump_stats(f"{prefix}.prof")
+            stream = io.StringIO()
+            pstats.Stats(cpu_profile, stream=stream).sort_stats("tottime").print_stats(TOP_FUNCTIONS)
+            report += "\ncProfile (CPU time)\n" + stream.getvalue()
+        with open(f"{prefix}.txt", 'w', encoding='utf-8') as f:
+            f.write(report)
+        print(f"Profile written to {prefix}.*", file=sys.stderr)
@@ -0,0 +1,173 @@
+from datetime import date, timedelta
+from typing import Iterable, Iterator, Optional, Set
+
+
+# netkeiba venue codes used in race_id
+JRA_VENUE_CODES = {
+    "札幌": "01",
+    "函館": "02",
+    "福島": "03",
+    "新潟": "04",
+    "東京": "05",
+    "中山": "06",
+    "中京": "07",
+    "京都": "08",
+    "阪神": "09",
+    "小倉": "10",
+}
+
+NAR_VENUE_CODES = {
+    "門別": "30",
+    "盛岡": "35",
+    "水沢": "36",
+    "浦和": "42",
+    "船橋": "43",
+    "大井": "44",
+    "川崎": "45",
+    "金沢": "46",
+    "笠松": "47",
+    "名古屋": "48",
+    "園田": "50",
+    "姫路": "51",
+    "高知": "54",
+    "佐賀": "55",
+    "帯広": "65",
+}
+
+MAX_RACES_PER_DAY = 12
+JRA_MAX_MEETINGS = 6
+JRA_MAX_DAYS_PER_MEETING = 12
+
+RESULT_URLS = {
+    "nar": "https://nar.netkeiba.com/race/result.html?race_id={race_id}",
+    "jra": "https://race.netkeiba.com/race/result.html?race_id={race_id}",
+}
+
+
+def race_type_of(race_id: str) -> str:
+    """Tell JRA and NAR race_ids apart by their venue code"""
+    return "jra" if race_id[4:6] in JRA_VENUE_CODES.values() else "nar"
+
+
+def race_url(race_id: str) -> str:
+    """Result page URL for a race_id"""
+    return RESULT_URLS[race_type_of(race_id)].format(race_id=race_id)
+
+
+class RaceDayTracker:
+    """
+    Remembers venue/days that turned out to have no more races
+
+    race_id layouts (the last two digits are the race number):
+      JRA: YYYY + venue + meeting (回) + day (日) + RR
+      NAR: YYYY + venue + MM + DD + RR
+
+    Once a race has no result table, the rest of that venue/day is skipped.
+    For JRA, a missing first race also ends the meeting, since meeting days
+    are numbered consecutively.
+
+    JRA race_ids carry no date, so races found are checked against
+    [start, end] with in_range(): a race before ``start`` ends its day, one
+    after ``end`` ends the venue's year (later meetings only run later).
+    """
+
+    def __init__(self, start: Optional[date] = None, end: Optional[date] = None):
+        self.start = start
+        self.end = end
+        # Races found without a result table / skipped after that / outside [start, end]
+        self.missing = 0
+        self.skipped = 0
+        self.out_of_range = 0
+        self._exhausted: Set[str] = set()
+
+    def mark_missing(self, race_id: str) -> None:
+        self.missing += 1
+        self._exhausted.add(race_id[:10])
+        if race_type_of(race_id) == "jra" and race_id[10:] == "01":
+            self._exhausted.add(race_id[:8])
+
+    def is_exhausted(self, race_id: str) -> bool:
+        if race_id[:10] in self._exhausted:
+            return True
+        return race_type_of(race_id) == "jra" and (race_id[:8] in self._exhausted or race_id[:6] in self._exhausted)
+
+    def in_range(self, race_id: str, race_date: Optional[date]) -> bool:
+        """True unless a race's date (None = unknown) falls outside [start, end]"""
+        if race_date is None:
+            return True
+        if self.end is not None and race_date > self.end:
+            self.out_of_range += 1
+            self._exhausted.add(race_id[:6] if race_type_of(race_id) == "jra" else race_id[:10])
+            return False
+        if self.start is not None and race_date < self.start:
+            self.out_of_range += 1
+            self._exhausted.add(race_id[:10])
+            return False
+        return True
+
+
+def _days(start: date, end: date) -> Iterator[date]:
+    day = start
+    while day <= end:
+        yield day
+        day += timedelta(days=1)
+
+
+def _races(prefix: str, tracker: Optional[RaceDayTracker]) -> Iterator[str]:
+    for race_number in range(1, MAX_RACES_PER_DAY + 1):
+        race_id = f"{prefix}{race_number:02d}"
+        if tracker is not None and tracker.is_exhausted(race_id):
+            return
+        yield race_id
+
+
+def nar_race_ids(start: date, end: date, venues: Iterable[str],
+                 tracker: Optional[RaceDayTracker] = None) -> Iterator[str]:
+    """Candidate NAR race_ids for every day in [start, end] at the given venues"""
+    codes = [NAR_VENUE_CODES[venue] for venue in venues]
+    for day in _days(start, end):
+        for code in codes:
+            yield from _races(f"{day.year}{code}{day.month:02d}{day.day:02d}", tracker)
+
+
+def jra_race_ids(start: date, end: date, venues: Iterable[str],
+                 tracker: Optional[RaceDayTracker] = None) -> Iterator[str]:
+    """
+    Candidate JRA race_ids for the years covered by [start, end]
+
+    JRA race_ids carry meeting and day numbers rather than a date, so the
+    meetings of those years are enumerated in order; with a tracker built
+    for [start, end], RaceDayTracker.in_range() drops races outside it and
+    stops each venue's year once its races are past ``end``.
+    """
+    codes = [JRA_VENUE_CODES[venue] for venue in venues]
+    for year in range(start.year, end.year + 1):
+        for code in codes:
+            for meeting in range(1, JRA_MAX_MEETINGS + 1):
+                for day in range(1, JRA_MAX_DAYS_PER_MEETING + 1):
+                    yield from _races(f"{year}{code}{meeting:02d}{day:02d}", tracker)
+
+
+def candidate_race_urls(start: date, end: date, venues: Iterable[str],
+                        tracker: Optional[RaceDayTracker] = None) -> Iterator[str]:
+    """
+    Lazily yield result URLs for a date range and a mix of JRA/NAR venue
+    names (e.g. "浦和" or "浦和競馬場")
+
+    Raises ValueError right away for unknown venues.
+    """
+    venues = [venue.replace("競馬場", "") for venue in venues]
+    unknown = [venue for venue in venues if venue not in JRA_VENUE_CODES and venue not in NAR_VENUE_CODES]
+    if unknown:
+        raise ValueError(f"Unknown venue(s): {', '.join(unknown)}")
+
+    nar_venues = [venue for venue in venues if venue in NAR_VENUE_CODES]
+    jra_venues = [venue for venue in venues if venue in JRA_VENUE_CODES]
+
+    def urls() -> Iterator[str]:
+        for race_id in nar_race_ids(start, end, nar_venues, tracker):
+            yield race_url(race_id)
+        for race_id in jra_race_ids(start, end, jra_venues, tracker):
+            yield race_url(race_id)
+
+    return urls()
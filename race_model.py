@@ -0,0 +1,226 @@
+import json
+import sys
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from corner_order import CornerMatrix
+from pace import decode_lap_times, decode_times
+from race_values import parse_distance, parse_float, parse_int, parse_race_date
+
+
+def format_time(seconds: float) -> str:
+    """93.0 -> "1:33.0", 59.8 -> "59.8" (inverse of parse_time_seconds)"""
+    minutes, rest = divmod(round(float(seconds), 1), 60)
+    return f"{int(minutes)}:{rest:04.1f}" if minutes else f"{rest:.1f}"
+
+
+def _intern(text: Optional[str]) -> Optional[str]:
+    # Venues, classes and conditions repeat across thousands of races
+    return sys.intern(text) if text else text
+
+
+@dataclass(slots=True)
+class Runners:
+    """
+    Runners of one race as parallel arrays (struct of arrays)
+
+    ``rank`` is 0 for runners without a finishing position (除外, 中止,
+    取消, ...), whose original text is kept in ``rank_text``; missing times
+    are NaN. ``rank_text`` and ``corner_passage`` are None when unused.
+    """
+    rank: np.ndarray            # int8
+    frame: np.ndarray           # int8
+    horse_number: np.ndarray    # int8
+    time_seconds: np.ndarray    # float32
+    last_3f: np.ndarray         # float32
+    horse_name: Tuple[str, ...]
+    rank_text: Optional[Tuple[str, ...]] = None
+    corner_passage: Optional[Tuple[str, ...]] = None
+
+    def __len__(self) -> int:
+        return len(self.horse_name)
+
+    @classmethod
+    def from_rows(cls, keys: Sequence[str], rows: Iterable[Sequence[Optional[str]]]) -> "Runners":
+        """
+        Build from raw cell texts, one row per runner, with ``keys`` naming
+        the columns (rank, frame, horse_number, horse_name, time, last_3f and
+        optionally corner_passage), as produced by the result page parsers
+        """
+        columns: Dict[str, List[str]] = {key: [] for key in keys}
+        for row in rows:
+            for key, value in zip(keys, row):
+                columns[key].append((value or "").strip())
+
+        ranks = columns["rank"]
+        rank = [parse_int(text) or 0 for text in ranks]
+        passages = columns.get("corner_passage")
+
+        return cls(
+            rank=np.array(rank, dtype=np.int8),
+            frame=np.array([parse_int(text) or 0 for text in columns["frame"]], dtype=np.int8),
+            horse_number=np.array([parse_int(text) or 0 for text in columns["horse_number"]], dtype=np.int8),
+            time_seconds=decode_times(columns["time"]),
+            last_3f=np.array([_nan_if_none(parse_float(text)) for text in columns["last_3f"]], dtype=np.float32),
+            horse_name=tuple(columns["horse_name"]),
+            rank_text=tuple(ranks) if not all(rank) else None,
+            corner_passage=tuple(passages) if passages and any(passages) else None,
+        )
+
+    @classmethod
+    def from_horses(cls, horses: List[Dict[str, str]]) -> "Runners":
+        """Build from the "horses" list of a result dict"""
+        keys = ["rank", "frame", "horse_number", "horse_name", "time", "last_3f", "corner_passage"]
+        return cls.from_rows(keys, ([horse.get(key) for key in keys] for horse in horses))
+
+    def to_horses(self) -> List[Dict[str, str]]:
+        """The "horses" list of a result dict"""
+        horses = []
+        for i in range(len(self)):
+            horse = {
+                "rank": self.rank_text[i] if self.rank_text else str(self.rank[i]),
+                "frame": str(self.frame[i]) if self.frame[i] else "",
+                "horse_number": str(self.horse_number[i]) if self.horse_number[i] else "",
+                "horse_name": self.horse_name[i],
+                "time": "" if np.isnan(self.time_seconds[i]) else format_time(self.time_seconds[i]),
+                "last_3f": "" if np.isnan(self.last_3f[i]) else f"{self.last_3f[i]:.1f}",
+            }
+            if self.corner_passage and self.corner_passage[i]:
+                horse["corner_passage"] = self.corner_passage[i]
+            horses.append(horse)
+        return horses
+
+
+def _nan_if_none(value: Optional[float]) -> float:
+    return float("nan") if value is None else value
+
+
+@dataclass(slots=True)
+class Race:
+    """Typed, compact form of one scraped race"""
+    race_id: str
+    race_type: str
+    race_url: str
+    race_date: Optional[date]
+    venue: Optional[str]
+    race_number: Optional[int]
+    race_name: Optional[str]
+    race_class: Optional[str]
+    surface: Optional[str]          # ダ, 芝 or 障
+    distance_m: Optional[int]
+    track_condition: Optional[str]
+    surface_condition: Optional[str]
+    runners: Runners
+    corners: Dict[int, str]         # corner number -> passing order string
+    lap_distances_m: np.ndarray     # int16
+    lap_cumulative: np.ndarray      # float32 seconds
+    lap_intervals: np.ndarray       # float32 seconds
+    page_title: Optional[str] = None
+    # Parsed once by corner_matrix() / corner_matrices()
+    _corner_matrix: Optional[CornerMatrix] = field(default=None, init=False, repr=False, compare=False)
+
+    @classmethod
+    def build(cls, url: str, race_id: str, race_type: str, race_info: Dict[str, Any], runners: Runners,
+              corner_passing_order: Dict[str, str], lap_times: Dict[str, List[str]]) -> "Race":
+        """Build from parsed sections, as the result page parsers produce them"""
+        surface, distance_m = parse_distance(race_info.get("distance"))
+        lap_distances_m, lap_cumulative, lap_intervals = decode_lap_times(lap_times)
+        return cls(
+            race_id=race_id,
+            race_type=_intern(race_type),
+            race_url=url,
+            race_date=parse_race_date(race_info.get("race_date")),
+            venue=_intern(race_info.get("venue")),
+            race_number=parse_int(race_info.get("race_number")),
+            race_name=race_info.get("race_name"),
+            race_class=_intern(race_info.get("race_class")),
+            surface=_intern(surface),
+            distance_m=distance_m,
+            track_condition=_intern(race_info.get("track_condition")),
+            surface_condition=_intern(race_info.get("surface_condition")),
+            runners=runners,
+            corners={int(key.replace("corner_", "")): order
+                     for key, order in corner_passing_order.items() if key.replace("corner_", "").isdigit()},
+            lap_distances_m=lap_distances_m,
+            lap_cumulative=lap_cumulative,
+            lap_intervals=lap_intervals,
+            page_title=race_info.get("page_title"),
+        )
+
+    def corner_width(self) -> int:
+        """Number of horse columns of corner_matrix()"""
+        return max(len(self.runners), int(self.runners.horse_number.max(initial=0)))
+
+    def corner_matrix(self) -> CornerMatrix:
+        """Passing orders as position/separation matrices (columns = horse number - 1)"""
+        if self._corner_matrix is None:
+            self._corner_matrix = CornerMatrix.parse(self.corners, self.corner_width())
+        return self._corner_matrix
+
+    @classmethod
+    def from_result(cls, result: Dict[str, Any]) -> "Race":
+        """Build from a result dict / race_data_*.json"""
+        return cls.build(result.get("race_url", ""), result.get("race_id", ""), result.get("race_type", ""),
+                         result.get("race_info", {}), Runners.from_horses(result.get("horses", [])),
+                         result.get("corner_passing_order", {}), result.get("lap_times", {}))
+
+    def to_result(self) -> Dict[str, Any]:
+        """Convert back to the result dict written as JSON"""
+        race_info: Dict[str, Any] = {}
+        for key, value in [("race_name", self.race_name),
+                           ("distance", f"{self.surface}{self.distance_m}m" if self.surface else None),
+                           ("track_condition", self.track_condition),
+                           ("surface_condition", self.surface_condition),
+                           ("race_class", self.race_class),
+                           ("race_number", str(self.race_number) if self.race_number is not None else None),
+                           ("race_date", self.race_date.strftime("%Y/%m/%d") if self.race_date else None),
+                           ("venue", self.venue),
+                           ("page_title", self.page_title)]:
+            if value is not None:
+                race_info[key] = value
+
+        lap_times: Dict[str, List[str]] = {}
+        if len(self.lap_cumulative):
+            lap_times["distances"] = [f"{d}m" for d in self.lap_distances_m]
+            lap_times["cumulative_times"] = [format_time(t) for t in self.lap_cumulative]
+        if len(self.lap_intervals):
+            lap_times["interval_times"] = [format_time(t) for t in self.lap_intervals]
+
+        return {
+            "race_url": self.race_url,
+            "race_id": self.race_id,
+            "race_type": self.race_type,
+            "race_info": race_info,
+            "horses": self.runners.to_horses(),
+            "corner_passing_order": {f"corner_{corner}": order for corner, order in self.corners.items()},
+            "lap_times": lap_times,
+        }
+
+
+def corner_matrices(races: Sequence[Race]) -> List[CornerMatrix]:
+    """corner_matrix() of every race, parsing the ones not parsed yet in one batch"""
+    missing = [race for race in races if race._corner_matrix is None]
+    if missing:
+        # corner_width() of every race in one reduction
+        sizes = np.array([len(race.runners) for race in missing], dtype=np.intp)
+        numbers = np.concatenate([race.runners.horse_number for race in missing]).astype(np.intp)
+        highest = np.zeros(len(missing), dtype=np.intp)
+        runs = sizes > 0
+        if runs.any():
+            highest[runs] = np.maximum.reduceat(numbers, (np.cumsum(sizes) - sizes)[runs])
+        parsed = CornerMatrix.parse_many([race.corners for race in missing], np.maximum(sizes, highest).tolist())
+        for race, matrix in zip(missing, parsed):
+            race._corner_matrix = matrix
+    return [race.corner_matrix() for race in races]
+
+
+def load_races(paths: Iterable[str]) -> List[Race]:
+    """Load race_data_*.json files into compact Race objects"""
+    races = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            races.append(Race.from_result(json.load(f)))
+    return races
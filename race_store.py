@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+import argparse
+import sqlite3
+import sys
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from corner_order import parse_passing_orders
+from race_values import parse_distance, parse_float, parse_int, parse_race_date, parse_time_seconds
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS races (
+    race_id TEXT PRIMARY KEY,
+    race_url TEXT,
+    race_type TEXT,
+    race_date TEXT,
+    venue TEXT,
+    race_number INTEGER,
+    race_name TEXT,
+    race_class TEXT,
+    distance TEXT,
+    surface TEXT,
+    distance_m INTEGER,
+    track_condition TEXT,
+    surface_condition TEXT,
+    field_size INTEGER
+);
+CREATE TABLE IF NOT EXISTS runners (
+    race_id TEXT NOT NULL REFERENCES races(race_id) ON DELETE CASCADE,
+    horse_number INTEGER,
+    frame INTEGER,
+    rank INTEGER,
+    rank_text TEXT,
+    horse_name TEXT,
+    time_seconds REAL,
+    last_3f REAL,
+    corner_passage TEXT,
+    PRIMARY KEY (race_id, horse_number)
+);
+CREATE TABLE IF NOT EXISTS corner_positions (
+    race_id TEXT NOT NULL REFERENCES races(race_id) ON DELETE CASCADE,
+    corner INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    horse_number INTEGER NOT NULL,
+    PRIMARY KEY (race_id, corner, horse_number)
+);
+CREATE TABLE IF NOT EXISTS laps (
+    race_id TEXT NOT NULL REFERENCES races(race_id) ON DELETE CASCADE,
+    lap_index INTEGER NOT NULL,
+    distance_m INTEGER,
+    cumulative_seconds REAL,
+    interval_seconds REAL,
+    PRIMARY KEY (race_id, lap_index)
+);
+CREATE INDEX IF NOT EXISTS idx_races_venue_date ON races (venue, race_date);
+CREATE INDEX IF NOT EXISTS idx_races_venue_distance_surface ON races (venue, distance, surface_condition);
+CREATE INDEX IF NOT EXISTS idx_runners_frame ON runners (frame);
+"""
+
+
+def normalize_venue(venue: str) -> str:
+    """Venues are stored with their full name: "浦和" -> "浦和競馬場" """
+    return venue if venue.endswith("競馬場") else f"{venue}競馬場"
+
+
+def corner_positions(order: str) -> List[Tuple[int, int]]:
+    """
+    (position, horse_number) pairs of a corner passing order string, as
+    corner_order.parse_passing_orders() reads it: horses abreast in "(...)"
+    share a position, "(*14,10,11,8)" -> all four at 1
+    """
+    _, numbers, positions, _ = parse_passing_orders([order])
+    return list(zip(positions.tolist(), numbers.tolist()))
+
+
+class RaceStore:
+    """
+    SQLite store of scraped races
+
+    Each race is upserted: its row in ``races`` is replaced and its
+    runners, corner positions and laps are rewritten, so re-scraping a race
+    never leaves stale rows behind.
+    """
+
+    def __init__(self, path: str, commit_every: int = 100):
+        self.path = path
+        self.commit_every = commit_every
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(SCHEMA)
+        self._pending = 0
+
+    def add(self, result: Dict[str, Any]) -> None:
+        """Upsert one scraped race"""
+        race_id = result.get("race_id")
+        race_info = result.get("race_info", {})
+        race_date = parse_race_date(race_info.get("race_date"))
+        surface, distance_m = parse_distance(race_info.get("distance"))
+        horses = result.get("horses", [])
+
+        # Deleting the race cascades to its runners, corners and laps
+        self.conn.execute("DELETE FROM races WHERE race_id = ?", (race_id,))
+        self.conn.execute(
+            "INSERT INTO races VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (race_id, result.get("race_url"), result.get("race_type"),
+             race_date.isoformat() if race_date else None, race_info.get("venue"),
+             parse_int(race_info.get("race_number")), race_info.get("race_name"),
+             race_info.get("race_class"), race_info.get("distance"), surface, distance_m,
+             race_info.get("track_condition"), race_info.get("surface_condition"), len(horses)),
+        )
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO runners VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(race_id, parse_int(horse.get("horse_number")), parse_int(horse.get("frame")),
+              parse_int(horse.get("rank")), horse.get("rank"), horse.get("horse_name"),
+              parse_time_seconds(horse.get("time")), parse_float(horse.get("last_3f")),
+              horse.get("corner_passage"))
+             for horse in horses],
+        )
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO corner_positions VALUES (?, ?, ?, ?)",
+            [(race_id, parse_int(corner.replace("corner_", "")), position, horse_number)
+             for corner, order in result.get("corner_passing_order", {}).items()
+             if parse_int(corner.replace("corner_", "")) is not None
+             for position, horse_number in corner_positions(order)],
+        )
+        lap_times = result.get("lap_times", {})
+        intervals = lap_times.get("interval_times", [])
+        self.conn.executemany(
+            "INSERT INTO laps VALUES (?, ?, ?, ?, ?)",
+            [(race_id, index, parse_int(distance.rstrip("m")), parse_time_seconds(cumulative),
+              parse_time_seconds(intervals[index]) if index < len(intervals) else None)
+             for index, (distance, cumulative) in enumerate(zip(lap_times.get("distances", []),
+                                                                lap_times.get("cumulative_times", [])))],
+        )
+
+        self._pending += 1
+        if self._pending >= self.commit_every:
+            self.commit()
+
+    def commit(self) -> None:
+        self.conn.commit()
+        self._pending = 0
+
+    def close(self) -> None:
+        self.commit()
+        self.conn.close()
+
+    def frame_win_rates(self, venue: str, distance: str, since: date, until: Optional[date] = None,
+                        surface_condition: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Starts, wins and win/top-3 rates per frame for races at a venue and
+        distance (e.g. "ダ1500m") between ``since`` and ``until``
+        """
+        sql = """
+            SELECT r.frame, COUNT(*) AS starts, SUM(r.rank = 1) AS wins, SUM(r.rank <= 3) AS top3
+            FROM races x JOIN runners r ON r.race_id = x.race_id
+            WHERE x.venue = ? AND x.distance = ? AND x.race_date >= ? AND r.rank IS NOT NULL
+        """
+        params: List[Any] = [normalize_venue(venue), distance, since.isoformat()]
+        if until:
+            sql += " AND x.race_date <= ?"
+            params.append(until.isoformat())
+        if surface_condition:
+            sql += " AND x.surface_condition = ?"
+            params.append(surface_condition)
+        sql += " GROUP BY r.frame ORDER BY r.frame"
+
+        return [{"frame": frame, "starts": starts, "wins": wins, "top3": top3,
+                 "win_rate": wins / starts, "top3_rate": top3 / starts}
+                for frame, starts, wins, top3 in self.conn.execute(sql, params)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Frame win rates from a race database")
+    parser.add_argument('db', help="SQLite database written with scraper.py --sqlite")
+    parser.add_argument('--venue', required=True, help="e.g. 浦和")
+    parser.add_argument('--distance', required=True, help="e.g. ダ1500m")
+    parser.add_argument('--weeks', type=int, default=8, help="look-back window (default: 8)")
+    parser.add_argument('--until', type=date.fromisoformat, default=date.today(),
+                        metavar='YYYY-MM-DD', help="end of the window (default: today)")
+    parser.add_argument('--surface-condition', help="e.g. 良, 稍重, 重, 不良")
+    args = parser.parse_args()
+
+    store = RaceStore(args.db)
+    try:
+        rows = store.frame_win_rates(args.venue, args.distance, args.until - timedelta(weeks=args.weeks),
+                                     args.until, args.surface_condition)
+    finally:
+        store.close()
+
+    if not rows:
+        print("No races found")
+        sys.exit(1)
+
+    print("枠  出走  勝利  勝率    複勝率")
+    for row in rows:
+        print(f"{row['frame']:>2}  {row['starts']:>4}  {row['wins']:>4}  "
+              f"{row['win_rate']:6.1%}  {row['top3_rate']:6.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import re
+from datetime import date
+from typing import Optional, Tuple
+
+
+def parse_int(text: Optional[str]) -> Optional[int]:
+    """"12" -> 12; non-numeric values such as "除外" or "中止" -> None"""
+    if not text:
+        return None
+    text = text.strip()
+    return int(text) if text.isdigit() else None
+
+
+def parse_float(text: Optional[str]) -> Optional[float]:
+    """"33.4" -> 33.4; empty or non-numeric -> None"""
+    if not text:
+        return None
+    try:
+        return float(text.strip())
+    except ValueError:
+        return None
+
+
+def parse_time_seconds(text: Optional[str]) -> Optional[float]:
+    """Race/lap time to seconds: "1:33.0" -> 93.0, "59.8" -> 59.8"""
+    if not text:
+        return None
+    match = re.fullmatch(r'(?:(\d+):)?(\d+(?:\.\d+)?)', text.strip())
+    if not match:
+        return None
+    minutes, seconds = match.groups()
+    return int(minutes or 0) * 60 + float(seconds)
+
+
+def parse_distance(text: Optional[str]) -> Tuple[Optional[str], Optional[int]]:
+    """"ダ1500m" -> ("ダ", 1500); the surface is ダ (dirt), 芝 (turf) or 障 (jump)"""
+    if not text:
+        return None, None
+    match = re.search(r'([ダ芝障])\D*?(\d+)m', text)
+    if not match:
+        return None, None
+    return match.group(1), int(match.group(2))
+
+
+def parse_race_date(text: Optional[str]) -> Optional[date]:
+    """"2025/06/22" -> date(2025, 6, 22)"""
+    if not text:
+        return None
+    match = re.fullmatch(r'(\d{4})/(\d{2})/(\d{2})', text.strip())
+    if not match:
+        return None
+    return date(*(int(part) for part in match.groups()))
@@ -0,0 +1,167 @@
+import asyncio
+import random
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+
+
+DEFAULT_RATE = 4.0          # requests per second per host
+DEFAULT_BURST = 4
+
+# Backoff: BACKOFF_BASE * 2^(failures - 1) seconds with jitter, at most BACKOFF_MAX
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+# Each failure halves the rate (not below MIN_RATE_FRACTION of the configured
+# one); each success gives back RECOVERY_STEP of it
+MIN_RATE_FRACTION = 0.05
+RECOVERY_STEP = 0.05
+
+# A response is slow when it takes SLOW_FACTOR x the host's typical time
+# (and at least SLOW_FLOOR seconds)
+SLOW_FACTOR = 3.0
+SLOW_FLOOR = 2.0
+EWMA_WEIGHT = 0.2
+
+
+def is_backoff_status(status: Optional[int]) -> bool:
+    """True for responses that mean "slow down": 403, 429 and 5xx (None = no response)"""
+    return status is None or status in (403, 429) or status >= 500
+
+
+def backoff_delay(failures: int) -> float:
+    """Jittered pause after ``failures`` consecutive failures: half fixed, half random"""
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (failures - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class HostLimiter:
+    """
+    Token bucket for one host, with adaptive backoff
+
+    Up to ``burst`` requests go out at once, then ``rate`` per second.
+    After a 403/429/5xx, a failed request or a slow response, the host is
+    paused for an exponentially growing, jittered delay and its rate is
+    halved; successful responses then raise the rate back step by step.
+    """
+
+    def __init__(self, rate: float = DEFAULT_RATE, burst: int = DEFAULT_BURST):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.failures = 0
+        self.backoffs = 0
+        self.typical: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self) -> None:
+        """Wait for a token (requests are let through in arrival order)"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def report(self, status: Optional[int], seconds: float, retry_after: Optional[float] = None) -> None:
+        """
+        Feed back how a request went: its HTTP status (None if it failed
+        without a response) and how long it took
+        """
+        slow = self.typical is not None and seconds > max(SLOW_FLOOR, self.typical * SLOW_FACTOR)
+        if status is not None and not is_backoff_status(status):
+            # Slow responses must not drag the baseline up with them
+            self.typical = seconds if self.typical is None else (
+                self.typical + EWMA_WEIGHT * (min(seconds, self.typical * SLOW_FACTOR) - self.typical))
+
+        if not is_backoff_status(status) and not slow:
+            self.failures = 0
+            self.rate = min(self.max_rate, self.rate + self.max_rate * RECOVERY_STEP)
+            return
+
+        self.failures += 1
+        self.backoffs += 1
+        self.rate = max(self.max_rate * MIN_RATE_FRACTION, self.rate / 2)
+        delay = backoff_delay(self.failures)
+        if retry_after is not None:
+            delay = max(delay, min(BACKOFF_MAX, retry_after))
+        now = time.monotonic()
+        self.paused_until = max(self.paused_until, now + delay)
+        self._refill(now)
+        self.tokens = 0.0
+
+    def status(self) -> Dict[str, Any]:
+        return {"rate": round(self.rate, 3), "max_rate": self.max_rate, "burst": self.burst,
+                "failures": self.failures, "backoffs": self.backoffs,
+                "paused_for": round(max(0.0, self.paused_until - time.monotonic()), 3)}
+
+
+class RateLimiter:
+    """
+    One HostLimiter per host, created on first use
+
+    Hosts are keyed by the race URL (e.g. race.netkeiba.com), not by the
+    server actually asked, so limits stay per netkeiba host with --base-url.
+    A ``rate`` of 0 or less disables limiting.
+    """
+
+    def __init__(self, rate: float = DEFAULT_RATE, burst: int = DEFAULT_BURST):
+        self.configure(rate, burst)
+
+    def configure(self, rate: float, burst: int = DEFAULT_BURST) -> None:
+        """Change the limits (forgetting every host's backoff state)"""
+        self.rate = rate
+        self.burst = burst
+        self.hosts: Dict[str, HostLimiter] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def host(self, url: str) -> HostLimiter:
+        host = urlparse(url).netloc
+        if host not in self.hosts:
+            self.hosts[host] = HostLimiter(self.rate, self.burst)
+        return self.hosts[host]
+
+    async def acquire(self, url: str) -> None:
+        if self.enabled:
+            await self.host(url).acquire()
+
+    def report(self, url: str, status: Optional[int], seconds: float, retry_after: Optional[float] = None) -> None:
+        if self.enabled:
+            self.host(url).report(status, seconds, retry_after)
+
+    async def before_retry(self, attempt: int) -> None:
+        """
+        Pause before retrying a throttled request; when enabled, acquire()
+        already waits out the host's backoff, otherwise back off here
+        """
+        if not self.enabled:
+            await asyncio.sleep(backoff_delay(attempt))
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        return {host: limiter.status() for host, limiter in self.hosts.items()}
+
+    def format_summary(self) -> str:
+        return "\n".join(f"{host}: {limiter.rate:.2f}/{limiter.max_rate:g} req/s, {limiter.backoffs} backoffs"
+                         for host, limiter in self.hosts.items())
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds from a Retry-After header given in seconds (HTTP dates are ignored)"""
+    try:
+        return max(0.0, float(value)) if value else None
+    except ValueError:
+        return None
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import json
+import re
+from typing import Any, Dict, List, Optional, Sequence
+from urllib.parse import urlparse
+
+from aiohttp import web
+
+from fetch_cache import FetchCache
+from race_ids import race_url
+from scraper import (DEFAULT_ALLOWED_HOSTS, OUTPUT_DIR, RATE_LIMITER, HostSlots, LazyBrowser, add_fetch_arguments,
+                     cached_result, configure_fetch, emit_result, extract_race_id, new_http_session,
+                     scrape_race_data, scrape_race_http)
+
+
+DEFAULT_PORT = 8700
+RACE_ID_RE = re.compile(r'\d{12}')
+
+
+class ScrapeService:
+    """
+    Long-lived scraper: one warm Chromium and one HTTP connection pool for
+    every request
+
+    Concurrent requests for the same race_id share a single scrape, and
+    finished results come from the fetch cache. Results are saved to
+    ``output_dir`` like the CLI does (not at all if it is None).
+    """
+
+    def __init__(self, engine: str = "html", fetch: str = "http", concurrency: int = 4,
+                 host_limits: Optional[Dict[str, int]] = None, cache: Optional[FetchCache] = None,
+                 allowed_hosts: Optional[Sequence[str]] = DEFAULT_ALLOWED_HOSTS,
+                 output_dir: Optional[str] = OUTPUT_DIR):
+        self.engine = engine
+        self.fetch = fetch
+        self.concurrency = max(1, concurrency)
+        self.cache = cache
+        self.allowed_hosts = allowed_hosts
+        self.output_dir = output_dir
+        self._host_semaphore = HostSlots(host_limits, self.concurrency)
+        self.browser = LazyBrowser()
+        self.session = None
+        self.scraped = 0
+        self.deduplicated = 0
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._in_flight: Dict[str, asyncio.Task] = {}
+
+    async def start(self) -> None:
+        if self.fetch == "http":
+            self.session = new_http_session(self.concurrency, self._host_semaphore.max_per_host)
+        else:
+            await self.browser.get()
+
+    async def close(self) -> None:
+        for task in list(self._in_flight.values()):
+            task.cancel()
+        await asyncio.gather(*self._in_flight.values(), return_exceptions=True)
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+        await self.browser.close()
+
+    async def scrape(self, url: str) -> Dict[str, Any]:
+        """Result of a race URL, joining a scrape of the same race already in flight"""
+        race_id = extract_race_id(url)
+        task = self._in_flight.get(race_id)
+        if task is None:
+            task = asyncio.create_task(self._scrape(url))
+            self._in_flight[race_id] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(race_id, None))
+        else:
+            self.deduplicated += 1
+        # A client that disconnects must not cancel the scrape for the others
+        return await asyncio.shield(task)
+
+    async def _scrape(self, url: str) -> Dict[str, Any]:
+        # Cache hits need neither the network nor a slot
+        result = cached_result(url, self.cache)
+        if result is not None:
+            return result
+
+        async with self._slots, self._host_semaphore(url):
+            if self.session is not None:
+                result = await scrape_race_http(url, self.session, self.browser, self.engine,
+                                                cache=self.cache, allowed_hosts=self.allowed_hosts)
+            else:
+                result = await scrape_race_data(url, await self.browser.get(), self.engine,
+                                                cache=self.cache, allowed_hosts=self.allowed_hosts)
+        self.scraped += 1
+        if self.output_dir is not None:
+            emit_result(result, [], self.output_dir)
+        return result
+
+    def status(self) -> Dict[str, Any]:
+        status = {"in_flight": sorted(self._in_flight), "scraped": self.scraped,
+                  "deduplicated": self.deduplicated}
+        if self.cache is not None:
+            status["cache"] = {"hits": self.cache.hits, "misses": self.cache.misses}
+        if RATE_LIMITER.enabled:
+            status["rate_limit"] = RATE_LIMITER.status()
+        return status
+
+
+def resolve_race(value: str) -> str:
+    """Race URL for a race_id or a netkeiba result URL"""
+    value = value.strip()
+    if RACE_ID_RE.fullmatch(value):
+        return race_url(value)
+    if urlparse(value).scheme in ("http", "https") and RACE_ID_RE.fullmatch(extract_race_id(value)):
+        return value
+    raise ValueError(f"Not a race_id or race result URL: {value!r}")
+
+
+async def handle_race(request: web.Request) -> web.Response:
+    """GET /race/{race_id}"""
+    try:
+        url = resolve_race(request.match_info["race_id"])
+    except ValueError as e:
+        raise web.HTTPBadRequest(text=str(e))
+    return await scrape_response(request.app["service"], [url], single=True)
+
+
+async def handle_scrape(request: web.Request) -> web.Response:
+    """POST /scrape with {"races": [race_id or URL, ...]}"""
+    try:
+        body = await request.json()
+        races = body["races"]
+        if isinstance(races, str) or not isinstance(races, list):
+            raise ValueError("races must be a list")
+        urls = [resolve_race(str(race)) for race in races]
+    except (ValueError, KeyError, TypeError) as e:
+        raise web.HTTPBadRequest(text=f"Expected {{\"races\": [race_id or URL, ...]}}: {e}")
+    return await scrape_response(request.app["service"], urls, single=False)
+
+
+async def scrape_response(service: ScrapeService, urls: List[str], single: bool) -> web.Response:
+    results = await asyncio.gather(*(service.scrape(url) for url in urls), return_exceptions=True)
+    payload = []
+    for url, result in zip(urls, results):
+        if isinstance(result, Exception):
+            print(f"Error scraping {url}: {result}")
+            if single:
+                raise web.HTTPBadGateway(text=f"Error scraping {url}: {result}")
+            payload.append({"race_url": url, "race_id": extract_race_id(url), "error": str(result)})
+        else:
+            payload.append(result)
+    return web.json_response(payload[0] if single else payload, dumps=compact_json)
+
+
+def compact_json(data: Any) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+
+async def handle_status(request: web.Request) -> web.Response:
+    """GET /status"""
+    return web.json_response(request.app["service"].status())
+
+
+def create_app(service: ScrapeService) -> web.Application:
+    app = web.Application()
+    app["service"] = service
+    app.router.add_get("/race/{race_id}", handle_race)
+    app.router.add_post("/scrape", handle_scrape)
+    app.router.add_get("/status", handle_status)
+
+    async def lifecycle(app):
+        await service.start()
+        yield
+        await service.close()
+
+    app.cleanup_ctx.append(lifecycle)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve race results from a long-running scraper")
+    parser.add_argument('--host', default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f"TCP port (default: {DEFAULT_PORT})")
+    parser.add_argument('--unix', metavar='PATH', help="listen on a Unix socket instead of TCP")
+    add_fetch_arguments(parser)
+    parser.add_argument('--no-save', action='store_true', help="do not write race_data_{race_id}.json files")
+    args = parser.parse_args()
+
+    service = ScrapeService(output_dir=None if args.no_save else OUTPUT_DIR, **configure_fetch(args))
+    app = create_app(service)
+    if args.unix:
+        web.run_app(app, path=args.unix)
+    else:
+        web.run_app(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,31 @@
 #!/usr/bin/env python3
+import argparse
 import asyncio
+import contextlib
+import glob
+import gzip
+import itertools
 import json
+import os
 import sys
 import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
 from urllib.parse import urlparse, parse_qs
+import aiohttp
+from bs4 import BeautifulSoup
 from playwright.async_api import async_playwright
-from typing import Dict, List, Any
+from typing import Dict, List, Any, AsyncIterator, Iterable, Iterator, Optional, Sequence, Tuple
+
+from crawl_manifest import CrawlManifest, is_result_complete
+from fetch_cache import FetchCache, DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, DEFAULT_PROVISIONAL_TTL
+from latency import LatencyStats, StageHistogram, race_timings, stage, timed
+from profiler import DEFAULT_PROFILE_DIR, PROFILERS, profiling
+from race_ids import RaceDayTracker, candidate_race_urls
+from race_model import Race, Runners
+from race_values import parse_race_date
+from rate_limit import DEFAULT_BURST, DEFAULT_RATE, RateLimiter, is_backoff_status, parse_retry_after
 
 
 def expand_venue_name(short_name: str) -> str:
@@ -62,52 +82,531 @@ def detect_race_type(url: str) -> str:
         return "unknown"
 
 
-async def scrape_race_data(url: str) -> Dict[str, Any]:
+# Extraction engines: "html" parses one page.content() snapshot with lxml,
+# "evaluate" extracts each section with one in-page JavaScript call,
+# "dom" queries each element through Playwright
+EXTRACTION_ENGINES = ("html", "evaluate", "dom")
+
+# Fetch backends: "http" downloads the result HTML with aiohttp and only falls
+# back to Chromium when the results table is missing, "browser" always uses
+# Playwright
+FETCH_BACKENDS = ("http", "browser")
+
+HTTP_HEADERS = {
+    "User-Agent": ("Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+                   "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"),
+    "Accept-Language": "ja,en;q=0.8",
+}
+
+OUTPUT_DIR = "output"
+
+OUTPUT_FORMATS = ("json", "ndjson")
+
+# Where result pages are requested from instead of netkeiba itself, e.g. a
+# local fixture_server.py; race URLs in results stay the netkeiba ones
+BASE_URL: Optional[str] = os.environ.get("NETKEIBA_BASE_URL") or None
+
+# Responses meaning the race has no result page
+NOT_FOUND_STATUSES = (404, 410)
+
+# Requests per page answered with 403/429/5xx before the race is given up
+FETCH_ATTEMPTS = 4
+
+# Latency samples behind the adaptive timeouts, reported at the end of a batch
+LATENCY = LatencyStats()
+
+# Requests per second per netkeiba host, shared by every fetch path
+RATE_LIMITER = RateLimiter()
+
+# Only the result page and netkeiba's own scripts are loaded in the browser;
+# images, fonts, CSS and anything from other hosts (ads, analytics) is blocked
+BLOCKED_RESOURCE_TYPES = frozenset({"image", "media", "font", "stylesheet"})
+DEFAULT_ALLOWED_HOSTS = ("netkeiba.com",)
+
+# Default number of races scraped at the same time per netkeiba host
+DEFAULT_HOST_CONCURRENCY = {
+    "nar.netkeiba.com": 4,
+    "race.netkeiba.com": 4,
+}
+
+
+async def scrape_race_data(url: str, browser=None, engine: str = "html",
+                           archive: bool = False, cache: Optional[FetchCache] = None,
+                           allowed_hosts: Optional[Sequence[str]] = DEFAULT_ALLOWED_HOSTS) -> Dict[str, Any]:
     """
     Scrape race result data from netkeiba URL
+
+    If ``browser`` is given, the race is scraped in a fresh context of that
+    browser instead of launching a new Chromium instance. ``engine`` selects
+    how data is extracted (see EXTRACTION_ENGINES). With ``archive`` the raw
+    result HTML is saved next to the JSON output (see save_html_archive()).
+    Fetched pages are stored in ``cache``; callers look races up with
+    cached_result() first, once. Requests are filtered as in
+    new_browser_context().
     """
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        page = await browser.new_page()
-        
+    if browser is None:
+        async with async_playwright() as p:
+            with stage("launch"):
+                browser = await p.chromium.launch(headless=True)
+            try:
+                return await scrape_race_data(url, browser, engine, archive, cache, allowed_hosts)
+            finally:
+                await browser.close()
+
+    context = await new_browser_context(browser, allowed_hosts)
+    try:
+        page = await context.new_page()
+        return await scrape_page(page, url, engine, archive, cache)
+    finally:
+        await context.close()
+
+
+async def scrape_page(page, url: str, engine: str = "html", archive: bool = False,
+                      cache: Optional[FetchCache] = None) -> Dict[str, Any]:
+    """Load a race result URL in an existing page and extract its data (storing the page in ``cache``)"""
+    # Timeouts follow observed latencies instead of fixed worst-case values
+    goto_timeout = LATENCY.timeout("goto", default=30, floor=5, ceiling=60)
+    page.set_default_timeout(goto_timeout * 1000)
+    
+    for attempt in range(1, FETCH_ATTEMPTS + 1):
+        with stage("rate_limit"):
+            await RATE_LIMITER.acquire(url)
+        start = time.perf_counter()
         try:
-            # Set longer timeout
-            page.set_default_timeout(60000)
-            
-            # Navigate to the page with longer timeout
-            await page.goto(url, wait_until='domcontentloaded', timeout=60000)
-            
-            # Detect race type and extract race_id
-            race_type = detect_race_type(url)
-            race_id = extract_race_id(url)
-            
-            # Extract race metadata
-            race_info = await extract_race_info(page, race_type)
-            
-            # Extract race results
-            horses_data = await extract_horses_data(page, race_type)
-            
-            # Extract corner passing order
-            corner_data = await extract_corner_data(page)
-            
-            # Extract lap times
-            lap_times = await extract_lap_times(page)
-            
-            # Create final data structure
-            result = {
-                "race_url": url,
-                "race_id": race_id,
-                "race_type": race_type,
-                "race_info": race_info,
-                "horses": horses_data,
-                "corner_passing_order": corner_data,
-                "lap_times": lap_times
-            }
-            
-            return result
-            
+            with stage("goto"):
+                response = await page.goto(request_url(url), wait_until='domcontentloaded',
+                                           timeout=goto_timeout * 1000)
+        except Exception:
+            RATE_LIMITER.report(url, None, time.perf_counter() - start)
+            raise
+        elapsed = time.perf_counter() - start
+        LATENCY.record("goto", elapsed)
+        if response is None:
+            break
+        RATE_LIMITER.report(url, response.status, elapsed, parse_retry_after(response.headers.get("retry-after")))
+        # A throttled or failing page is never parsed, so it cannot end up cached or saved
+        if not is_backoff_status(response.status):
+            break
+        if attempt == FETCH_ATTEMPTS:
+            raise RuntimeError(f"HTTP {response.status} for {url}")
+        print(f"HTTP {response.status} for {url}, retrying ({attempt}/{FETCH_ATTEMPTS - 1})")
+        await RATE_LIMITER.before_retry(attempt)
+    
+    if response is not None and response.status in NOT_FOUND_STATUSES:
+        print(f"No result page (HTTP {response.status}): {url}")
+        return empty_result(url)
+    
+    # Detect race type and extract race_id
+    race_type = detect_race_type(url)
+    race_id = extract_race_id(url)
+    
+    with stage("table_wait"):
+        table_selector = await wait_for_results_table(page, race_type)
+    
+    if engine == "html":
+        # One snapshot of the DOM, parsed locally instead of per-element round-trips
+        with stage("content"):
+            html = await page.content()
+        if archive:
+            save_html_archive(url, html)
+        result = parse_race_html(html, url)
+        store_in_cache(cache, url, html, result)
+        return result
+    
+    if engine == "evaluate":
+        # All sections from one DOM snapshot in a single round-trip
+        race_info, horses_data, corner_data, lap_times = await timed(
+            "evaluate", evaluate_race(page, race_type, table_selector))
+    else:
+        # The sections are independent, so query them concurrently
+        race_info, horses_data, corner_data, lap_times = await asyncio.gather(
+            timed("race_info", extract_race_info(page, race_type)),
+            timed("horses", extract_horses_data(page, race_type, table_selector)
+                  if table_selector is not None else no_horses()),
+            timed("corners", extract_corner_data(page)),
+            timed("lap_times", extract_lap_times(page)),
+        )
+    
+    html = await page.content() if archive or cache is not None else None
+    if archive:
+        save_html_archive(url, html)
+    
+    # Create final data structure
+    result = {
+        "race_url": url,
+        "race_id": race_id,
+        "race_type": race_type,
+        "race_info": race_info,
+        "horses": horses_data,
+        "corner_passing_order": corner_data,
+        "lap_times": lap_times
+    }
+    
+    store_in_cache(cache, url, html, result)
+    return result
+
+
+def timing_record(timings: Dict[str, float]) -> Dict[str, float]:
+    """A race_timings() dict as stored in a result: seconds rounded to 0.1 ms"""
+    return {name: round(seconds, 4) for name, seconds in timings.items()}
+
+
+def empty_result(url: str) -> Dict[str, Any]:
+    """Result for a page that has no race results (not run yet or no such race)"""
+    return {
+        "race_url": url,
+        "race_id": extract_race_id(url),
+        "race_type": detect_race_type(url),
+        "race_info": {},
+        "horses": [],
+        "corner_passing_order": {},
+        "lap_times": {}
+    }
+
+
+def cached_result(url: str, cache: Optional[FetchCache], archive: bool = False) -> Optional[Dict[str, Any]]:
+    """Parse a race from the fetch cache, or return None on a cache miss"""
+    if cache is None:
+        return None
+    
+    html = cache.get(detect_race_type(url), extract_race_id(url))
+    if html is None:
+        return None
+    
+    if archive:
+        save_html_archive(url, html)
+    return parse_race_html(html, url)
+
+
+def store_in_cache(cache: Optional[FetchCache], url: str, html: Optional[str], result: Dict[str, Any]) -> None:
+    """Cache fetched HTML for a race, marking it confirmed or provisional"""
+    if cache is None or html is None:
+        return
+    cache.put(detect_race_type(url), extract_race_id(url), html, is_result_complete(result))
+
+
+def set_base_url(base_url: Optional[str]) -> None:
+    global BASE_URL
+    BASE_URL = base_url.rstrip("/") if base_url else None
+
+
+def request_url(url: str) -> str:
+    """
+    URL to actually request for a race URL: unchanged, or with BASE_URL set
+    https://nar.netkeiba.com/race/result.html?race_id=X ->
+    {BASE_URL}/nar.netkeiba.com/race/result.html?race_id=X
+    """
+    if not BASE_URL:
+        return url
+    parsed = urlparse(url)
+    return f"{BASE_URL}/{parsed.netloc}{parsed.path}" + (f"?{parsed.query}" if parsed.query else "")
+
+
+def is_allowed_host(host: str, allowed_hosts: Sequence[str]) -> bool:
+    """True if host is one of allowed_hosts or a subdomain of one"""
+    return any(host == allowed or host.endswith("." + allowed) for allowed in allowed_hosts)
+
+
+async def new_browser_context(browser, allowed_hosts: Optional[Sequence[str]] = DEFAULT_ALLOWED_HOSTS):
+    """
+    Create a browser context that only loads what the result page needs
+
+    Requests for BLOCKED_RESOURCE_TYPES and requests to hosts outside
+    ``allowed_hosts`` are aborted. Pass None to load everything.
+    """
+    context = await browser.new_context()
+    if allowed_hosts is None:
+        return context
+    if BASE_URL:
+        allowed_hosts = tuple(allowed_hosts) + (urlparse(BASE_URL).hostname or "",)
+    
+    async def filter_request(route):
+        request = route.request
+        host = urlparse(request.url).hostname or ""
+        if request.resource_type in BLOCKED_RESOURCE_TYPES or not is_allowed_host(host, allowed_hosts):
+            await route.abort()
+        else:
+            await route.continue_()
+    
+    await context.route("**/*", filter_request)
+    return context
+
+
+class LazyBrowser:
+    """Launch Chromium on first use and share it between callers"""
+
+    def __init__(self):
+        self._playwright = None
+        self._browser = None
+        self._lock = asyncio.Lock()
+
+    async def get(self):
+        async with self._lock:
+            if self._browser is None:
+                # Counted for the race that happened to need the browser first
+                with stage("launch"):
+                    self._playwright = await async_playwright().start()
+                    try:
+                        self._browser = await self._playwright.chromium.launch(headless=True)
+                    except Exception:
+                        # Don't leave a driver process behind for every caller that retries
+                        await self._playwright.stop()
+                        self._playwright = None
+                        raise
+        return self._browser
+
+    async def close(self):
+        if self._browser is not None:
+            await self._browser.close()
+            self._browser = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+
+def new_http_session(concurrency: int = 4, per_host: int = 4) -> aiohttp.ClientSession:
+    """Create a pooled HTTP session for fetching result pages"""
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=per_host)
+    return aiohttp.ClientSession(connector=connector, headers=HTTP_HEADERS,
+                                 timeout=aiohttp.ClientTimeout(total=30))
+
+
+class HostSlots:
+    """
+    Per-host caps on races loading at once: DEFAULT_HOST_CONCURRENCY
+    updated with ``host_limits``, and ``default`` for any other host
+    """
+
+    def __init__(self, host_limits: Optional[Dict[str, int]] = None, default: int = 4):
+        self.limits = dict(DEFAULT_HOST_CONCURRENCY)
+        if host_limits:
+            self.limits.update(host_limits)
+        self.default = default
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    @property
+    def max_per_host(self) -> int:
+        return max(self.limits.values())
+
+    def __call__(self, url: str) -> asyncio.Semaphore:
+        """Semaphore of the host of ``url``"""
+        host = urlparse(url).netloc
+        if host not in self._semaphores:
+            self._semaphores[host] = asyncio.Semaphore(self.limits.get(host, self.default))
+        return self._semaphores[host]
+
+
+def decode_html(body: bytes, charset: Optional[str] = None) -> str:
+    """
+    Decode a netkeiba page
+
+    Uses the charset from the Content-Type header, then the <meta> charset,
+    and defaults to EUC-JP. EUC-JP is decoded as EUC-JIS-2004, which also
+    covers the extra kanji found in horse and jockey names.
+    """
+    if not charset:
+        meta_match = re.search(rb'<meta[^>]+charset=["\']?([\w-]+)', body[:4096], re.I)
+        charset = meta_match.group(1).decode('ascii') if meta_match else 'euc-jp'
+    if charset.lower().replace('_', '-') in ('euc-jp', 'eucjp', 'x-euc-jp'):
+        charset = 'euc_jis_2004'
+    try:
+        return body.decode(charset, errors='replace')
+    except LookupError:
+        return body.decode('euc_jis_2004', errors='replace')
+
+
+async def fetch_race_html(session: aiohttp.ClientSession, url: str) -> Optional[str]:
+    """
+    Download a result page and return its decoded HTML (None if not found)
+
+    Responses with 403/429/5xx are retried up to FETCH_ATTEMPTS times, after
+    the rate limiter's backoff.
+    """
+    for attempt in range(1, FETCH_ATTEMPTS + 1):
+        with stage("rate_limit"):
+            await RATE_LIMITER.acquire(url)
+        start = time.perf_counter()
+        body = None
+        try:
+            with stage("http_fetch"):
+                async with session.get(request_url(url)) as response:
+                    if response.status < 400:
+                        body = await response.read()
+        except Exception:
+            RATE_LIMITER.report(url, None, time.perf_counter() - start)
+            raise
+        elapsed = time.perf_counter() - start
+        RATE_LIMITER.report(url, response.status, elapsed, parse_retry_after(response.headers.get("Retry-After")))
+        if not is_backoff_status(response.status) or attempt == FETCH_ATTEMPTS:
+            break
+        print(f"HTTP {response.status} for {url}, retrying ({attempt}/{FETCH_ATTEMPTS - 1})")
+        await RATE_LIMITER.before_retry(attempt)
+    
+    if response.status in NOT_FOUND_STATUSES:
+        return None
+    response.raise_for_status()
+    LATENCY.record("http_fetch", elapsed)
+    return decode_html(body, response.charset)
+
+
+async def scrape_race_http(url: str, session: Optional[aiohttp.ClientSession] = None,
+                           browser: Optional[LazyBrowser] = None,
+                           engine: str = "html", archive: bool = False,
+                           cache: Optional[FetchCache] = None,
+                           allowed_hosts: Optional[Sequence[str]] = DEFAULT_ALLOWED_HOSTS) -> Dict[str, Any]:
+    """
+    Scrape a race over plain HTTP
+
+    Falls back to scrape_race_data() when the page names a race but its
+    results table is not in the server-rendered HTML (i.e. it is added by
+    script). ``browser`` is used for that fallback if given. Pages without
+    a race header (not run yet, no such race) give an empty result without
+    launching the browser. Like scrape_race_data() it only stores pages in
+    ``cache``.
+    """
+    if session is None:
+        async with new_http_session() as session:
+            return await scrape_race_http(url, session, browser, engine, archive, cache, allowed_hosts)
+    
+    html = await fetch_race_html(session, url)
+    if html is None:
+        print(f"No result page (HTTP 404): {url}")
+        return empty_result(url)
+    
+    with stage("soup"):
+        soup = BeautifulSoup(html, 'lxml')
+    if find_results_table(soup, detect_race_type(url)) is not None:
+        if archive:
+            save_html_archive(url, html)
+        result = parse_race_soup(soup, url)
+        store_in_cache(cache, url, html, result)
+        return result
+    
+    if not has_race_header(soup):
+        print(f"No results on page: {url}")
+        return empty_result(url)
+    
+    print(f"Results table missing from HTML, falling back to browser: {url}")
+    if browser is None:
+        return await scrape_race_data(url, engine=engine, archive=archive, cache=cache,
+                                      allowed_hosts=allowed_hosts)
+    return await scrape_race_data(url, await browser.get(), engine, archive, cache, allowed_hosts)
+
+
+async def scrape_races(urls: Iterable[str], concurrency: int = 1,
+                       host_limits: Optional[Dict[str, int]] = None,
+                       engine: str = "html", fetch: str = "browser",
+                       archive: bool = False,
+                       cache: Optional[FetchCache] = None,
+                       tracker: Optional[RaceDayTracker] = None,
+                       allowed_hosts: Optional[Sequence[str]] = DEFAULT_ALLOWED_HOSTS,
+                       timings: bool = False) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Scrape many race URLs with a single Chromium instance
+
+    ``concurrency`` workers (pages in one browser, or requests on one HTTP
+    connection pool for ``fetch="http"``) are fed race URLs through a work
+    queue. ``host_limits`` caps how many of them may be loading from the
+    same host at once (defaults to DEFAULT_HOST_CONCURRENCY). Chromium is
+    only launched when a worker needs it. Results are yielded in completion
+    order; races that fail are reported and skipped.
+
+    With a ``tracker`` (for generated race_ids, see race_ids.py), races
+    without a result table are not yielded but mark the rest of their
+    venue/day as exhausted, and already queued races of that day are dropped.
+    Races dated outside the tracker's range are not yielded either.
+    
+    With ``timings`` every result gets a "timings" dict of seconds per
+    stage (see latency.stage()), including "total" for the whole race.
+    """
+    concurrency = max(1, concurrency)
+    host_semaphore = HostSlots(host_limits, concurrency)
+    url_queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    result_queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+    browser = LazyBrowser()
+    session = None
+    if fetch == "http":
+        session = new_http_session(concurrency, host_semaphore.max_per_host)
+    
+    async def feed():
+        # urls may be a lazy iterator; only pull as fast as the workers drain
+        try:
+            for url in urls:
+                await url_queue.put(url)
         finally:
-            await browser.close()
+            for _ in range(concurrency):
+                await url_queue.put(None)
+    
+    async def worker():
+        context = None
+        page = None
+        try:
+            while True:
+                url = await url_queue.get()
+                if url is None:
+                    break
+                race_id = extract_race_id(url)
+                if tracker is not None and tracker.is_exhausted(race_id):
+                    tracker.skipped += 1
+                    continue
+                
+                try:
+                    with race_timings() if timings else contextlib.nullcontext() as record:
+                        start = time.perf_counter()
+                        # Cache hits need neither the network nor a host slot
+                        result = cached_result(url, cache, archive)
+                        if result is None:
+                            async with host_semaphore(url):
+                                if session is not None:
+                                    result = await scrape_race_http(url, session, browser, engine, archive,
+                                                                    cache, allowed_hosts)
+                                else:
+                                    if context is None:
+                                        context = await new_browser_context(await browser.get(), allowed_hosts)
+                                    if page is None or page.is_closed():
+                                        page = await context.new_page()
+                                    result = await scrape_page(page, url, engine, archive, cache)
+                        if record is not None:
+                            record["total"] = time.perf_counter() - start
+                            result["timings"] = timing_record(record)
+                    
+                    if tracker is not None and not result.get("horses"):
+                        tracker.mark_missing(race_id)
+                        continue
+                    if tracker is not None and not tracker.in_range(
+                            race_id, parse_race_date(result.get("race_info", {}).get("race_date"))):
+                        continue
+                    await result_queue.put(result)
+                except Exception as e:
+                    print(f"Error scraping {url}: {e}")
+        except Exception as e:
+            print(f"Scraping worker failed: {e}")
+        finally:
+            if context is not None:
+                await context.close()
+            await result_queue.put(done)
+    
+    tasks = [asyncio.create_task(feed())]
+    tasks += [asyncio.create_task(worker()) for _ in range(concurrency)]
+    try:
+        running = concurrency
+        while running:
+            item = await result_queue.get()
+            if item is done:
+                running -= 1
+            else:
+                yield item
+        # Surface errors raised while iterating urls
+        if tasks[0].done():
+            tasks[0].result()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if session is not None:
+            await session.close()
+        await browser.close()
 
 
 async def extract_race_info(page, race_type: str) -> Dict[str, Any]:
@@ -198,33 +697,98 @@ async def extract_race_info(page, race_type: str) -> Dict[str, Any]:
     return race_info
 
 
-async def extract_horses_data(page, race_type: str) -> List[Dict[str, Any]]:
-    """Extract individual horse data from the results table"""
-    horses = []
-    
-    # Different selectors for NAR vs JRA
+# Results table selectors in order of preference (primary, fallback)
+RESULT_TABLE_SELECTORS = {
+    "nar": ['table.RaceTable01.ResultMain', 'table.RaceTable01'],
+    "jra": ['table.RaceTable01.RaceCommon_Table', 'table.RaceCommon_Table'],
+}
+
+
+def result_table_selectors(race_type: str) -> List[str]:
+    """Return the results table selectors for a race type (JRA layout for unknown)"""
+    return RESULT_TABLE_SELECTORS.get(race_type, RESULT_TABLE_SELECTORS["jra"])
+
+
+def result_columns(race_type: str):
+    """
+    Return (min_cells, time_index, last_3f_index, corner_passage_index)
+    describing the results table layout for a race type
+    """
     if race_type == "nar":
-        table_selector = 'table.RaceTable01.ResultMain'
-        table_rows_selector = 'table.RaceTable01.ResultMain tbody tr'
-    else:  # JRA or unknown
-        table_selector = 'table.RaceTable01.RaceCommon_Table'
-        table_rows_selector = 'table.RaceTable01.RaceCommon_Table tbody tr'
+        # NAR: 着順, 枠, 馬番, 馬名, 性齢, 斤量, 騎手, タイム, 着差, 人気, 単勝オッズ, 後3F, 厩舎, 馬体重
+        return 12, 7, 11, None
+    # JRA: 着順, 枠, 馬番, 馬名, 性齢, 斤量, 騎手, タイム, 着差, 人気, 単勝オッズ, 後3F, コーナー通過順, 厩舎, 馬体重
+    return 13, 7, 11, 12
+
+
+# Resolves to 1 + index of the first results table selector present, -1 once
+# the page is clearly not going to show results (redirected away from the
+# result page, or fully loaded for a while without a table), 0 otherwise
+READINESS_JS = """
+([selectors, graceMs]) => {
+    for (let i = 0; i < selectors.length; i++) {
+        if (document.querySelector(selectors[i])) {
+            return i + 1;
+        }
+    }
+    if (!location.pathname.includes('result')) {
+        return -1;
+    }
+    const nav = performance.getEntriesByType('navigation')[0];
+    if (nav && nav.loadEventEnd > 0 && performance.now() - nav.loadEventEnd > graceMs) {
+        return -1;
+    }
+    return 0;
+}
+"""
+
+# How long a fully loaded page may go without a results table
+NO_RESULT_GRACE_MS = 1500
+
+
+async def wait_for_results_table(page, race_type: str) -> Optional[str]:
+    """
+    Wait for the results table and return the selector that matched, or None
+
+    All candidate selectors are checked together and the wait ends as soon
+    as one appears, or as soon as the page turns out to have no results.
+    """
+    selectors = result_table_selectors(race_type)
+    timeout = LATENCY.timeout("table_wait", default=15, floor=2, ceiling=30)
+    start = time.perf_counter()
     
-    # Wait for the results table to load with multiple attempts
     try:
-        await page.wait_for_selector(table_selector, timeout=30000)
-    except Exception:
-        # Try alternative selectors
-        try:
-            if race_type == "nar":
-                await page.wait_for_selector('table.RaceTable01', timeout=15000)
-                table_rows_selector = 'table.RaceTable01 tbody tr'
-            else:
-                await page.wait_for_selector('table.RaceCommon_Table', timeout=15000)
-                table_rows_selector = 'table.RaceCommon_Table tbody tr'
-        except Exception as e:
-            print(f"Could not find results table: {e}")
+        handle = await page.wait_for_function(READINESS_JS, arg=[selectors, NO_RESULT_GRACE_MS],
+                                              timeout=timeout * 1000)
+        index = await handle.json_value()
+    except Exception as e:
+        LATENCY.record("table_timeout", time.perf_counter() - start)
+        print(f"Could not find results table: {e}")
+        return None
+    
+    if index < 0:
+        LATENCY.record("no_result", time.perf_counter() - start)
+        print(f"No results table on page: {page.url}")
+        return None
+    
+    LATENCY.record("table_wait", time.perf_counter() - start)
+    return selectors[index - 1]
+
+
+async def extract_horses_data(page, race_type: str, table_selector: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Extract individual horse data from the results table
+
+    ``table_selector`` is the selector returned by wait_for_results_table();
+    if not given, this waits for the table itself.
+    """
+    horses = []
+    
+    if table_selector is None:
+        table_selector = await wait_for_results_table(page, race_type)
+        if table_selector is None:
             return []
+    table_rows_selector = f"{table_selector} tbody tr"
     
     # Find all table rows with horse data
     rows = await page.query_selector_all(table_rows_selector)
@@ -235,20 +799,9 @@ async def extract_horses_data(page, race_type: str) -> List[Dict[str, Any]]:
             cells = await row.query_selector_all('td')
             
             # Different column structures for NAR vs JRA
-            if race_type == "nar":
-                # NAR: 着順, 枠, 馬番, 馬名, 性齢, 斤量, 騎手, タイム, 着差, 人気, 単勝オッズ, 後3F, 厩舎, 馬体重
-                if len(cells) < 12:
-                    continue
-                time_index = 7
-                last_3f_index = 11
-                corner_passage_index = None
-            else:
-                # JRA: 着順, 枠, 馬番, 馬名, 性齢, 斤量, 騎手, タイム, 着差, 人気, 単勝オッズ, 後3F, コーナー通過順, 厩舎, 馬体重
-                if len(cells) < 13:
-                    continue
-                time_index = 7
-                last_3f_index = 11
-                corner_passage_index = 12
+            min_cells, time_index, last_3f_index, corner_passage_index = result_columns(race_type)
+            if len(cells) < min_cells:
+                continue
             
             # Extract rank (着順) - first column
             rank_elem = await cells[0].query_selector('.Rank')
@@ -301,6 +854,11 @@ async def extract_horses_data(page, race_type: str) -> List[Dict[str, Any]]:
     return horses
 
 
+async def no_horses() -> List[Dict[str, Any]]:
+    """Stand-in for extract_horses_data() when the page has no results table"""
+    return []
+
+
 async def extract_corner_data(page) -> Dict[str, str]:
     """Extract corner passing order data"""
     corner_data = {}
@@ -368,33 +926,797 @@ async def extract_lap_times(page) -> Dict[str, List[str]]:
     return lap_data
 
 
-async def main():
-    if len(sys.argv) < 2:
-        print("Usage: python scraper.py <race_url>")
-        sys.exit(1)
+def element_text(elem) -> str:
+    """Visible text of a parsed element, whitespace-collapsed like inner_text()"""
+    if elem is None:
+        return ""
+    return " ".join(elem.get_text().split())
+
+
+def table_body_rows(table) -> list:
+    """
+    Body rows of a parsed table
+
+    Browsers wrap bare rows in an implicit <tbody>, lxml does not; treat every
+    row outside <thead>/<tfoot> as a body row in that case.
+    """
+    if table.find('tbody') is not None:
+        return table.select('tbody tr')
+    return [tr for tr in table.find_all('tr') if tr.find_parent(['thead', 'tfoot']) is None]
+
+
+def parse_race_html(html: str, url: str) -> Dict[str, Any]:
+    """Build the race result dict from a single HTML snapshot of a result page"""
+    with stage("soup"):
+        soup = BeautifulSoup(html, 'lxml')
+    return parse_race_soup(soup, url)
+
+
+def parse_race_soup(soup, url: str) -> Dict[str, Any]:
+    """Build the race result dict from an already parsed result page"""
+    race_type = detect_race_type(url)
     
-    url = sys.argv[1]
+    # Same stage names as the browser engines' extract_*() calls
+    with stage("race_info"):
+        race_info = parse_race_info(soup, race_type)
+    with stage("horses"):
+        horses_data = parse_horses_data(soup, race_type)
+    with stage("corners"):
+        corner_data = parse_corner_data(soup)
+    with stage("lap_times"):
+        lap_times = parse_lap_times(soup)
     
-    try:
-        print(f"Scraping data from: {url}")
-        result = await scrape_race_data(url)
-        
-        # Extract race_id for filename
-        race_id = result.get('race_id', 'unknown')
-        
-        # Save to JSON file with race_id in filename
-        output_file = f"output/race_data_{race_id}.json"
-        import os
-        os.makedirs("output", exist_ok=True)
-        
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(result, f, ensure_ascii=False, indent=2)
+    return {
+        "race_url": url,
+        "race_id": extract_race_id(url),
+        "race_type": race_type,
+        "race_info": race_info,
+        "horses": horses_data,
+        "corner_passing_order": corner_data,
+        "lap_times": lap_times
+    }
+
+
+def parse_race_model(html: str, url: str) -> Race:
+    """
+    Parse a result page straight into a compact Race
+
+    Runner cells go from the results table into the Race's arrays without
+    building per-horse dicts, which is what matters when loading a season.
+    """
+    soup = BeautifulSoup(html, 'lxml')
+    race_type = detect_race_type(url)
+    fields = horse_fields(race_type)
+    
+    return Race.build(
+        url, extract_race_id(url), race_type,
+        parse_race_info(soup, race_type),
+        Runners.from_rows([key for key, _, _ in fields], parse_horse_rows(soup, race_type, fields)),
+        parse_corner_data(soup),
+        parse_lap_times(soup),
+    )
+
+
+def race_info_from_texts(texts: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build race_info from the raw header texts of a result page
+
+    ``texts`` holds "race_name", "race_num" and "title" (text or None) and
+    "race_data01", "item04", "item03" and "race_data02" (lists of texts), as
+    collected by parse_race_info() and evaluate_race().
+    """
+    race_info = {}
+    
+    if texts.get("race_name") is not None:
+        race_info["race_name"] = texts["race_name"].strip()
+    
+    for text in texts.get("race_data01", []):
+        text = text.strip()
+        if 'm' in text and ('ダ' in text or '芝' in text):
+            race_info["distance"] = text
+        elif text in ['良', '稍重', '重', '不良']:
+            race_info["track_condition"] = text
+    
+    for key in ["item04", "item03"]:
+        for text in texts.get(key, []):
+            surface_match = re.search(r'馬場:([良稍重不良]+)', text.strip())
+            if surface_match:
+                race_info["surface_condition"] = surface_match.group(1)
+                break
+        if race_info.get("surface_condition"):
+            break
+    
+    for text in texts.get("race_data02", []):
+        text = text.strip()
+        if ('A' in text and any(char.isdigit() for char in text)) or \
+           'サラ系' in text or text in ['新馬', '未勝利', '1勝クラス', '2勝クラス', '3勝クラス', 'オープン', 'G3', 'G2', 'G1']:
+            race_info["race_class"] = text
+    
+    if texts.get("race_num") is not None:
+        race_num_match = re.search(r'(\d+)R?', texts["race_num"].strip())
+        if race_num_match:
+            race_info["race_number"] = race_num_match.group(1)
+    
+    title_text = texts.get("title")
+    if title_text is not None:
+        title_text = title_text.strip()
+        date_match = re.search(r'(\d{4})年(\d{1,2})月(\d{1,2})日', title_text)
+        if date_match:
+            year, month, day = date_match.groups()
+            race_info["race_date"] = f"{year}/{month.zfill(2)}/{day.zfill(2)}"
         
-        print(f"Data saved to: {output_file}")
-        print(json.dumps(result, ensure_ascii=False, indent=2))
+        venue_match = re.search(r'\d{4}年\d{1,2}月\d{1,2}日\s+(\S+?)\d+R', title_text)
+        if venue_match:
+            race_info["venue"] = expand_venue_name(venue_match.group(1))
         
+        if not race_info.get("race_name"):
+            race_info["page_title"] = title_text
+    
+    return race_info
+
+
+def parse_race_info(soup, race_type: str) -> Dict[str, Any]:
+    """Snapshot counterpart of extract_race_info()"""
+    def first_text(selector):
+        elem = soup.select_one(selector)
+        return element_text(elem) if elem is not None else None
+    
+    def all_texts(selector):
+        return [element_text(elem) for elem in soup.select(selector)]
+    
+    try:
+        return race_info_from_texts({
+            "race_name": first_text('.RaceName'),
+            "race_data01": all_texts('.RaceData01 span'),
+            "item04": all_texts('.Item04'),
+            "item03": all_texts('.Item03'),
+            "race_data02": all_texts('.RaceData02 span'),
+            "race_num": first_text('.RaceNum'),
+            "title": first_text('title'),
+        })
+    except Exception as e:
+        print(f"Error extracting race info: {e}")
+        return {}
+
+
+def find_results_table(soup, race_type: str):
+    """Return the first results table present in the snapshot, or None"""
+    for selector in result_table_selectors(race_type):
+        table = soup.select_one(selector)
+        if table is not None:
+            return table
+    return None
+
+
+def has_race_header(soup) -> bool:
+    """True if the snapshot names a race (a result page, with or without its table)"""
+    return bool(element_text(soup.select_one('.RaceName')))
+
+
+def horse_fields(race_type: str) -> List[Tuple[str, int, Optional[str]]]:
+    """(key, cell index, selector within the cell) for each horse field"""
+    _, time_index, last_3f_index, corner_passage_index = result_columns(race_type)
+    fields = [
+        ("rank", 0, '.Rank'),
+        ("frame", 1, 'div'),
+        ("horse_number", 2, 'div'),
+        ("horse_name", 3, '.Horse_Name a'),
+        ("time", time_index, '.RaceTime'),
+        ("last_3f", last_3f_index, None),
+    ]
+    if corner_passage_index:
+        fields.append(("corner_passage", corner_passage_index, '.PassageRate'))
+    return fields
+
+
+def horse_from_values(fields, values: List[Optional[str]]) -> Dict[str, str]:
+    """Build a horse dict from the texts found for horse_fields() (None if missing)"""
+    horse_data = {}
+    for (key, _, _), value in zip(fields, values):
+        value = (value or "").strip()
+        # corner_passage is only present on JRA pages
+        if key != "corner_passage" or value:
+            horse_data[key] = value
+    return horse_data
+
+
+def parse_horses_data(soup, race_type: str) -> List[Dict[str, Any]]:
+    """Snapshot counterpart of extract_horses_data()"""
+    fields = horse_fields(race_type)
+    return [horse_from_values(fields, values) for values in parse_horse_rows(soup, race_type, fields)]
+
+
+def parse_horse_rows(soup, race_type: str, fields=None) -> List[List[Optional[str]]]:
+    """Raw texts of horse_fields() for each runner row of the results table"""
+    rows = []
+    
+    table = find_results_table(soup, race_type)
+    if table is None:
+        print("Could not find results table")
+        return []
+    
+    min_cells = result_columns(race_type)[0]
+    fields = fields or horse_fields(race_type)
+    
+    for row in table_body_rows(table):
+        try:
+            cells = row.find_all('td', recursive=False)
+            if len(cells) < min_cells:
+                continue
+            
+            values = []
+            for _, index, selector in fields:
+                if index >= len(cells):
+                    values.append(None)
+                    continue
+                elem = cells[index].select_one(selector) if selector else cells[index]
+                values.append(element_text(elem) if elem is not None else None)
+            
+            rows.append(values)
+            
+        except Exception as e:
+            print(f"Error extracting horse data: {e}")
+            continue
+    
+    return rows
+
+
+def parse_corner_data(soup) -> Dict[str, str]:
+    """Snapshot counterpart of extract_corner_data()"""
+    corner_data = {}
+    
+    try:
+        for row in soup.select('table.Corner_Num tr'):
+            header = row.select_one('th strong')
+            if header:
+                order_cell = row.find('td')
+                if order_cell:
+                    corner_data[f"corner_{element_text(header)}"] = element_text(order_cell)
+                    
     except Exception as e:
-        print(f"Error: {e}")
+        print(f"Error extracting corner data: {e}")
+    
+    return corner_data
+
+
+def lap_times_from_rows(rows: List[Tuple[List[str], List[str]]]) -> Dict[str, List[str]]:
+    """Build lap_times from (header texts, cell texts) of each Race_HaronTime row"""
+    lap_data = {}
+    
+    if len(rows) >= 2:
+        lap_data["distances"] = rows[0][0]
+        lap_data["cumulative_times"] = rows[1][1]
+    
+    if len(rows) >= 3:
+        lap_data["interval_times"] = rows[2][1]
+    
+    return lap_data
+
+
+def parse_lap_times(soup) -> Dict[str, List[str]]:
+    """Snapshot counterpart of extract_lap_times()"""
+    try:
+        lap_table = soup.select_one('table.Race_HaronTime')
+        if lap_table:
+            return lap_times_from_rows([
+                ([element_text(th) for th in row.find_all('th')],
+                 [element_text(td) for td in row.find_all('td')])
+                for row in table_body_rows(lap_table)
+            ])
+                    
+    except Exception as e:
+        print(f"Error extracting lap times: {e}")
+    
+    return {}
+
+
+# In-page extractors for the "evaluate" engine, combined in RACE_JS so that a
+# page costs a single round-trip
+
+RACE_INFO_JS = """
+() => {
+    const first = (selector) => {
+        const elem = document.querySelector(selector);
+        return elem ? elem.innerText : null;
+    };
+    const all = (selector) => Array.from(document.querySelectorAll(selector), elem => elem.innerText);
+    return {
+        race_name: first('.RaceName'),
+        race_data01: all('.RaceData01 span'),
+        item04: all('.Item04'),
+        item03: all('.Item03'),
+        race_data02: all('.RaceData02 span'),
+        race_num: first('.RaceNum'),
+        title: document.querySelector('title') ? document.title : null,
+    };
+}
+"""
+
+HORSE_ROWS_JS = """
+([rowsSelector, fields]) => Array.from(document.querySelectorAll(rowsSelector), row => {
+    const cells = row.querySelectorAll('td');
+    const values = fields.map(([index, selector]) => {
+        if (index >= cells.length) {
+            return null;
+        }
+        const elem = selector ? cells[index].querySelector(selector) : cells[index];
+        return elem ? elem.innerText : null;
+    });
+    return [cells.length, values];
+})
+"""
+
+CORNER_ROWS_JS = """
+() => Array.from(document.querySelectorAll('table.Corner_Num tr'), row => {
+    const header = row.querySelector('th strong');
+    const cell = row.querySelector('td');
+    return header && cell ? [header.innerText, cell.innerText] : null;
+}).filter(pair => pair !== null)
+"""
+
+LAP_ROWS_JS = """
+() => {
+    const table = document.querySelector('table.Race_HaronTime');
+    if (!table) {
+        return null;
+    }
+    return Array.from(table.querySelectorAll('tbody tr'), row => [
+        Array.from(row.querySelectorAll('th'), th => th.innerText),
+        Array.from(row.querySelectorAll('td'), td => td.innerText),
+    ]);
+}
+"""
+
+
+RACE_JS = f"""
+([rowsSelector, fields]) => ({{
+    race_info: ({RACE_INFO_JS})(),
+    horses: rowsSelector ? ({HORSE_ROWS_JS})([rowsSelector, fields]) : [],
+    corners: ({CORNER_ROWS_JS})(),
+    laps: ({LAP_ROWS_JS})(),
+}})
+"""
+
+
+async def evaluate_race(page, race_type: str, table_selector: Optional[str]):
+    """
+    All sections of a result page in one page.evaluate call
+
+    Returns (race_info, horses, corner_passing_order, lap_times); the horse
+    table is skipped when ``table_selector`` is None.
+    """
+    min_cells = result_columns(race_type)[0]
+    fields = horse_fields(race_type)
+    rows_selector = f"{table_selector} tbody tr" if table_selector is not None else None
+    
+    try:
+        data = await page.evaluate(RACE_JS, [rows_selector, [[index, selector] for _, index, selector in fields]])
+    except Exception as e:
+        print(f"Error extracting race data: {e}")
+        return {}, [], {}, {}
+    
+    return (
+        race_info_from_texts(data["race_info"]),
+        [horse_from_values(fields, values) for cell_count, values in data["horses"] if cell_count >= min_cells],
+        {f"corner_{header}": order for header, order in data["corners"]},
+        lap_times_from_rows(data["laps"]) if data["laps"] else {},
+    )
+
+
+def read_urls_file(path: str) -> List[str]:
+    """Read race URLs from a file, one per line (blank lines and # comments ignored)"""
+    urls = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                urls.append(line)
+    return urls
+
+
+def save_result(result: Dict[str, Any], output_dir: str = OUTPUT_DIR) -> str:
+    """Save a scraped race to output/race_data_{race_id}.json"""
+    # Extract race_id for filename
+    race_id = result.get('race_id', 'unknown')
+    
+    # Save to JSON file with race_id in filename
+    output_file = os.path.join(output_dir, f"race_data_{race_id}.json")
+    os.makedirs(output_dir, exist_ok=True)
+    
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    
+    return output_file
+
+
+class NdjsonSink:
+    """
+    Write each result as one compact JSON line to a file (appended) or to
+    stdout ("-"), flushed per race so consumers can read while scraping
+    continues
+    """
+
+    def __init__(self, path: str = "-"):
+        self.path = path
+        if path == "-":
+            self._file = sys.stdout
+        else:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(path, 'a', encoding='utf-8')
+
+    def add(self, result: Dict[str, Any]) -> None:
+        self._file.write(json.dumps(result, ensure_ascii=False, separators=(',', ':')) + "\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        if self._file is not sys.stdout:
+            self._file.close()
+
+
+def skip_completed(urls: Iterable[str], manifest: CrawlManifest) -> Iterator[str]:
+    """Lazily drop URLs whose race already has a complete result"""
+    for url in urls:
+        if not manifest.is_complete(extract_race_id(url)):
+            yield url
+
+
+def archive_path(race_id: str, output_dir: str = OUTPUT_DIR) -> str:
+    """Path of the raw HTML archive for a race"""
+    return os.path.join(output_dir, f"race_data_{race_id}.html.gz")
+
+
+def save_html_archive(url: str, html: str, output_dir: str = OUTPUT_DIR) -> str:
+    """
+    Save raw result HTML as gzip next to the JSON output
+
+    The race URL is stored in a leading HTML comment so the archive can be
+    re-parsed on its own.
+    """
+    output_file = archive_path(extract_race_id(url), output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    
+    with gzip.open(output_file, 'wt', encoding='utf-8', compresslevel=6) as f:
+        f.write(f"<!-- race_url: {url} -->\n")
+        f.write(html)
+    
+    return output_file
+
+
+def load_html_archive(path: str) -> Tuple[str, str]:
+    """Read an archive written by save_html_archive(), returning (url, html)"""
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        header = f.readline()
+        html = f.read()
+    
+    url_match = re.match(r'<!-- race_url: (\S+) -->', header)
+    if not url_match:
+        raise ValueError(f"Missing race_url header in {path}")
+    return url_match.group(1), html
+
+
+def reparse_archive(path: str) -> Optional[Dict[str, Any]]:
+    """Rebuild the race result dict from one archived HTML file (None on error)"""
+    try:
+        url, html = load_html_archive(path)
+        return parse_race_html(html, url)
+    except Exception as e:
+        print(f"Error re-parsing {path}: {e}")
+        return None
+
+
+def rebuild_from_archive(output_dir: str = OUTPUT_DIR, workers: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """Re-parse every archived race in output_dir, spread across CPU cores"""
+    paths = sorted(glob.glob(os.path.join(output_dir, "race_data_*.html.gz")))
+    if not paths:
+        return
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for result in executor.map(reparse_archive, paths, chunksize=16):
+            if result is not None:
+                yield result
+
+
+def reparse_archive_model(path: str) -> Optional[Race]:
+    """Parse one archived HTML file straight into a Race (None on error)"""
+    try:
+        url, html = load_html_archive(path)
+        return parse_race_model(html, url)
+    except Exception as e:
+        print(f"Error re-parsing {path}: {e}")
+        return None
+
+
+def load_archived_races(output_dir: str = OUTPUT_DIR, workers: Optional[int] = None) -> List[Race]:
+    """
+    Parse every archived race in output_dir into compact Race objects,
+    spread across CPU cores, without building result dicts on the way
+    """
+    paths = sorted(glob.glob(os.path.join(output_dir, "race_data_*.html.gz")))
+    if not paths:
+        return []
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return [race for race in executor.map(reparse_archive_model, paths, chunksize=16) if race is not None]
+
+
+def add_fetch_arguments(parser: argparse.ArgumentParser) -> None:
+    """Options for how pages are fetched, shared by scraper.py and scrape_daemon.py"""
+    parser.add_argument('--concurrency', type=int, default=4,
+                        help="number of races scraping in parallel (default: 4)")
+    parser.add_argument('--per-host', type=int,
+                        help="max parallel pages per netkeiba host (default: 4)")
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE,
+                        help=f"max requests per second per netkeiba host, slowed down automatically on "
+                             f"403/429/5xx or slow responses; 0 = unlimited (default: {DEFAULT_RATE:g})")
+    parser.add_argument('--burst', type=int, default=DEFAULT_BURST,
+                        help=f"requests per host that may go out at once before --rate applies "
+                             f"(default: {DEFAULT_BURST})")
+    parser.add_argument('--engine', choices=EXTRACTION_ENGINES, default="html",
+                        help="data extraction engine (default: html)")
+    parser.add_argument('--fetch', choices=FETCH_BACKENDS, default="http",
+                        help="how result pages are downloaded (default: http)")
+    parser.add_argument('--allow-host', action='append', default=[], metavar='HOST',
+                        help="extra host the browser may load resources from (repeatable)")
+    parser.add_argument('--no-block', action='store_true',
+                        help="let the browser load images, fonts, CSS and third-party resources")
+    parser.add_argument('--base-url', default=BASE_URL, metavar='URL',
+                        help="request pages from this server instead of netkeiba, e.g. a local "
+                             "fixture_server.py (default: $NETKEIBA_BASE_URL)")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR,
+                        help=f"fetch cache directory (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument('--cache-max-mb', type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help="fetch cache disk budget in MB (default: 1024)")
+    parser.add_argument('--provisional-ttl', type=float, default=DEFAULT_PROVISIONAL_TTL,
+                        help="seconds to cache results that are not final yet (default: 600)")
+    parser.add_argument('--no-cache', action='store_true', help="disable the fetch cache")
+
+
+def configure_fetch(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Apply the add_fetch_arguments() options: point the scraper at
+    --base-url, configure the rate limiter and open the fetch cache.
+    Returns them as keyword arguments for scrape_races() / ScrapeService.
+    """
+    set_base_url(args.base_url)
+    RATE_LIMITER.configure(args.rate, args.burst)
+    
+    cache = None
+    if not args.no_cache:
+        cache = FetchCache(args.cache_dir, args.cache_max_mb * 1024 * 1024, args.provisional_ttl)
+    allowed_hosts = None
+    if not args.no_block:
+        allowed_hosts = DEFAULT_ALLOWED_HOSTS + tuple(args.allow_host)
+    host_limits = None
+    if args.per_host:
+        host_limits = {host: args.per_host for host in DEFAULT_HOST_CONCURRENCY}
+    
+    return {"engine": args.engine, "fetch": args.fetch, "concurrency": args.concurrency,
+            "host_limits": host_limits, "cache": cache, "allowed_hosts": allowed_hosts}
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Scrape netkeiba race results")
+    parser.add_argument('urls', nargs='*', metavar='race_url', help="race result URL(s)")
+    parser.add_argument('--urls-file', help="file with one race URL per line")
+    parser.add_argument('--date-from', type=date.fromisoformat, metavar='YYYY-MM-DD',
+                        help="generate race IDs from this date (requires --venues)")
+    parser.add_argument('--date-to', type=date.fromisoformat, metavar='YYYY-MM-DD',
+                        help="last date for generated race IDs (default: --date-from)")
+    parser.add_argument('--venues', type=lambda s: [v for v in s.split(',') if v],
+                        help="comma separated venue names for generated race IDs, e.g. 浦和,大井,東京")
+    add_fetch_arguments(parser)
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default="json",
+                        help="json: one race_data_{race_id}.json file per race; ndjson: one compact "
+                             "line per race to --output instead (default: json)")
+    parser.add_argument('--output', default="-", metavar='PATH',
+                        help="file the ndjson lines are appended to, with its crawl manifest next to it "
+                             "as PATH.manifest.jsonl (default: - for stdout)")
+    parser.add_argument('--parquet', metavar='DIR',
+                        help="also append results to Parquet datasets under DIR "
+                             "(partitioned by year/venue/race_type)")
+    parser.add_argument('--sqlite', metavar='PATH',
+                        help="also upsert results into a SQLite database (see race_store.py)")
+    parser.add_argument('--archive', action='store_true',
+                        help="also save the raw result HTML as race_data_{race_id}.html.gz")
+    parser.add_argument('--from-archive', nargs='?', const=OUTPUT_DIR, metavar='DIR',
+                        help="rebuild the JSON files from archived HTML in DIR "
+                             "(default: output) without any network access")
+    parser.add_argument('--force', action='store_true',
+                        help="in batch mode, also re-scrape races that already have complete output")
+    parser.add_argument('--timings', action='store_true',
+                        help="add per-stage timings to each result and print a histogram summary at the end")
+    parser.add_argument('--metrics-file', metavar='PATH',
+                        help="write the stage timing histograms to PATH in Prometheus text format "
+                             "(implies --timings)")
+    parser.add_argument('--profile', nargs='?', const=DEFAULT_PROFILE_DIR, metavar='DIR',
+                        help="profile the run and write a report and collapsed stacks for flame graphs "
+                             f"to DIR (default: {DEFAULT_PROFILE_DIR})")
+    parser.add_argument('--profiler', choices=PROFILERS, default="sample",
+                        help="sample: stack sampling only; cprofile: also a cProfile .prof file "
+                             "of CPU time (default: sample)")
+    args = parser.parse_args(argv)
+    args.timings = args.timings or bool(args.metrics_file)
+    return args
+
+
+def open_sinks(args: argparse.Namespace) -> list:
+    """Extra outputs every result is written to besides its JSON file"""
+    sinks = []
+    if args.format == "ndjson":
+        sinks.append(NdjsonSink(args.output))
+    if args.parquet:
+        # pyarrow is only needed when Parquet output is asked for
+        from parquet_sink import ParquetSink
+        sinks.append(ParquetSink(args.parquet))
+    if args.sqlite:
+        from race_store import RaceStore
+        sinks.append(RaceStore(args.sqlite))
+    return sinks
+
+
+def emit_result(result: Dict[str, Any], sinks: list, output_dir: Optional[str] = OUTPUT_DIR) -> Optional[str]:
+    """Save a result as JSON (unless output_dir is None) and pass it to the sinks"""
+    output_file = save_result(result, output_dir) if output_dir is not None else None
+    for sink in sinks:
+        sink.add(result)
+    return output_file
+
+
+def report_timings(records: List[Dict[str, float]], metrics_file: Optional[str]) -> None:
+    """Print the stage timings of a run and write them to ``metrics_file`` if given"""
+    histogram = StageHistogram()
+    for record in records:
+        histogram.add(record)
+    print("Stage timings:")
+    print(histogram.format_summary())
+    if metrics_file:
+        histogram.write_prometheus(metrics_file)
+
+
+async def main():
+    args = parse_args(sys.argv[1:])
+    sinks = open_sinks(args)
+    # Keep stdout for the ndjson stream; progress messages go to stderr
+    quiet_stdout = args.format == "ndjson" and args.output == "-"
+    try:
+        with contextlib.ExitStack() as stack:
+            if quiet_stdout:
+                stack.enter_context(contextlib.redirect_stdout(sys.stderr))
+            if args.profile:
+                stack.enter_context(profiling(args.profile, args.profiler))
+            await run(args, sinks)
+    finally:
+        for sink in sinks:
+            sink.close()
+
+
+async def run(args: argparse.Namespace, sinks: list):
+    # With ndjson the stream replaces the per-race JSON files
+    json_files = args.format == "json"
+    
+    if args.from_archive:
+        rebuilt = 0
+        for result in rebuild_from_archive(args.from_archive):
+            emit_result(result, sinks, args.from_archive if json_files else None)
+            rebuilt += 1
+        print(f"Rebuilt {rebuilt} races from {args.from_archive}")
+        return
+    
+    options = configure_fetch(args)
+    cache = options["cache"]
+    allowed_hosts = options["allowed_hosts"]
+    
+    urls = list(args.urls)
+    if args.urls_file:
+        urls.extend(read_urls_file(args.urls_file))
+    
+    tracker = None
+    if args.date_from:
+        if not args.venues:
+            print("--date-from requires --venues")
+            sys.exit(1)
+        tracker = RaceDayTracker(args.date_from, args.date_to or args.date_from)
+        try:
+            generated = candidate_race_urls(args.date_from, args.date_to or args.date_from,
+                                            args.venues, tracker)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+    
+    if not urls and tracker is None:
+        print("Usage: python scraper.py <race_url> [<race_url> ...] [--urls-file FILE]")
+        print("       python scraper.py --date-from YYYY-MM-DD [--date-to YYYY-MM-DD] --venues 浦和,大井")
+        sys.exit(1)
+    
+    if len(urls) == 1 and tracker is None:
+        url = urls[0]
+        try:
+            print(f"Scraping data from: {url}")
+            with race_timings() if args.timings else contextlib.nullcontext() as record:
+                start = time.perf_counter()
+                result = cached_result(url, cache, args.archive)
+                if result is None and args.fetch == "http":
+                    result = await scrape_race_http(url, engine=args.engine, archive=args.archive, cache=cache,
+                                                    allowed_hosts=allowed_hosts)
+                elif result is None:
+                    result = await scrape_race_data(url, engine=args.engine, archive=args.archive, cache=cache,
+                                                    allowed_hosts=allowed_hosts)
+                if record is not None:
+                    record["total"] = time.perf_counter() - start
+                    result["timings"] = timing_record(record)
+                    report_timings([result["timings"]], args.metrics_file)
+            
+            output_file = emit_result(result, sinks, OUTPUT_DIR if json_files else None)
+            
+            if output_file:
+                print(f"Data saved to: {output_file}")
+                print(json.dumps(result, ensure_ascii=False, indent=2))
+            
+        except Exception as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        return
+    
+    # Batch mode: one browser / connection pool for all races
+    if tracker is None:
+        print(f"Scraping {len(urls)} races")
+    else:
+        urls = itertools.chain(urls, generated)
+        print(f"Scraping races for {', '.join(args.venues)} from {args.date_from} to {args.date_to or args.date_from}")
+    saved = 0
+    attempted = 0
+    histogram = StageHistogram()
+    
+    # Skip races that a previous (possibly interrupted) run already finished;
+    # nothing is kept to resume from when streaming to stdout
+    manifest = None
+    if json_files:
+        manifest = CrawlManifest(OUTPUT_DIR)
+    elif args.output != "-":
+        manifest = CrawlManifest.for_stream(args.output)
+    pending = urls if args.force or manifest is None else skip_completed(urls, manifest)
+    
+    def counted(urls):
+        nonlocal attempted
+        for url in urls:
+            attempted += 1
+            yield url
+    
+    async for result in scrape_races(counted(pending), archive=args.archive, tracker=tracker,
+                                     timings=args.timings, **options):
+        output_file = emit_result(result, sinks, OUTPUT_DIR if json_files else None)
+        if manifest is not None:
+            manifest.record(result)
+        saved += 1
+        if "timings" in result:
+            histogram.add(result["timings"])
+            # Kept current during the crawl, so a slow night can be looked at while it runs
+            if args.metrics_file:
+                histogram.write_prometheus(args.metrics_file)
+        if output_file:
+            print(f"Data saved to: {output_file}")
+    
+    not_run = 0 if tracker is None else tracker.missing + tracker.skipped + tracker.out_of_range
+    skipped = 0 if manifest is None else manifest.skipped
+    print(f"Scraped {saved}/{attempted - not_run} races ({skipped} already complete)")
+    if tracker is not None:
+        print(f"No result table: {tracker.missing} races ({tracker.skipped} more skipped on those days)")
+        if tracker.out_of_range:
+            print(f"Outside {args.date_from} - {args.date_to or args.date_from}: {tracker.out_of_range} races")
+    if cache is not None:
+        print(f"Fetch cache: {cache.hits} hits, {cache.misses} misses")
+    if LATENCY.summary():
+        print("Latency:")
+        print(LATENCY.format_summary())
+    if RATE_LIMITER.hosts:
+        print("Rate limit:")
+        print(RATE_LIMITER.format_summary())
+    if histogram.races:
+        print(f"Stage timings ({histogram.races} races):")
+        print(histogram.format_summary())
+    if saved < attempted - not_run:
         sys.exit(1)
 
 
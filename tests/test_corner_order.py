@@ -0,0 +1,96 @@
+import glob
+import json
+import os
+
+import numpy as np
+
+from corner_order import ABREAST, CLOSE, GAP, WIDE_GAP, CornerMatrix, parse_passing_orders
+from race_model import Race
+from track_bias import RunnerTable, early_positions
+
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fixtures")
+
+
+def parsed(orders):
+    return [array.tolist() for array in parse_passing_orders(orders)]
+
+
+def test_docstring_example():
+    _, numbers, positions, separations = parsed(["14(10,11,8)1-9"])
+    assert numbers == [14, 10, 11, 8, 1, 9]
+    assert positions == [1, 2, 2, 2, 5, 6]
+    assert separations == [CLOSE, CLOSE, ABREAST, ABREAST, CLOSE, GAP]
+
+
+def test_leading_group_with_marker():
+    _, numbers, positions, separations = parsed(["(*14,10,11,8)"])
+    assert numbers == [14, 10, 11, 8]
+    assert positions == [1, 1, 1, 1]
+    assert separations == [CLOSE, ABREAST, ABREAST, ABREAST]
+
+
+def test_fixture_corner_with_gaps():
+    # 大井 ダ1200m, fixtures/race_data_202544070105.json
+    _, numbers, positions, separations = parsed(["(*3,5),1-2=7,4,6"])
+    assert numbers == [3, 5, 1, 2, 7, 4, 6]
+    assert positions == [1, 1, 3, 4, 5, 6, 7]
+    assert separations == [CLOSE, ABREAST, CLOSE, GAP, WIDE_GAP, CLOSE, CLOSE]
+
+
+def test_several_strings_and_multi_digit_numbers():
+    order_index, numbers, positions, separations = parsed(["12=16,3", "(16,12)-103"])
+    assert order_index == [0, 0, 0, 1, 1, 1]
+    assert numbers == [12, 16, 3, 16, 12, 103]
+    assert positions == [1, 2, 3, 1, 1, 3]
+    assert separations == [CLOSE, WIDE_GAP, CLOSE, CLOSE, ABREAST, GAP]
+
+
+def test_empty_strings():
+    assert parsed([]) == [[], [], [], []]
+    assert parsed([""]) == [[], [], [], []]
+    order_index, numbers, _, _ = parsed(["", "5,6"])
+    assert order_index == [1, 1]
+    assert numbers == [5, 6]
+
+
+def test_unbalanced_string_does_not_leak():
+    _, numbers, positions, separations = parsed(["(1,2", "3,4"])
+    assert numbers == [1, 2, 3, 4]
+    assert positions == [1, 1, 1, 2]
+    assert separations == [CLOSE, ABREAST, CLOSE, CLOSE]
+
+
+def test_corner_matrix():
+    matrix = CornerMatrix.parse({3: "(*3,5),1-2", 4: "", 1: "5,3,2,1"})
+    assert matrix.corners.tolist() == [1, 3]
+    assert matrix.positions.tolist() == [[4, 3, 2, 0, 1], [3, 4, 1, 0, 1]]
+    assert matrix.for_runners(np.array([5, 9])).tolist() == [[1, 0], [1, 0]]
+
+
+def test_parse_many_matches_parse():
+    orders = [{3: "(*3,5),1-2", 4: "", 1: "5,3,2,1"}, {}, {2: "12=16,3"}]
+    matrices = CornerMatrix.parse_many(orders, [None, 4, 16])
+    for order, width, matrix in zip(orders, [None, 4, 16], matrices):
+        expected = CornerMatrix.parse(order, width)
+        assert matrix.corners.tolist() == expected.corners.tolist()
+        assert matrix.positions.tolist() == expected.positions.tolist()
+        assert matrix.separations.tolist() == expected.separations.tolist()
+    assert matrices[1].positions.shape == (0, 4)
+
+
+def test_early_positions_read_the_corner_matrices():
+    races = []
+    for path in sorted(glob.glob(os.path.join(FIXTURE_DIR, "race_data_*.json"))):
+        with open(path, encoding='utf-8') as f:
+            races.append(Race.from_result(json.load(f)))
+    table = RunnerTable.from_races(races)
+    # 大井 ダ1200m: first corner "(*3,5),1-2=7,4,6"
+    race = next(i for i, race in enumerate(races) if race.race_id == "202544070105")
+    rows = table.columns["race"] == race
+    by_number = dict(zip(table.columns["horse_number"][rows].tolist(), table.columns["early_position"][rows].tolist()))
+    assert by_number == {3: 1, 5: 1, 1: 3, 2: 4, 7: 5, 4: 6, 6: 7, 8: 0}
+    # Parsed once and kept on the race
+    assert races[race].corner_matrix() is races[race].corner_matrix()
+    assert early_positions(races, table.columns["race"], table.columns["horse_number"]).tolist() \
+        == table.columns["early_position"].tolist()
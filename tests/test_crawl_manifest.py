@@ -0,0 +1,72 @@
+import json
+
+from crawl_manifest import CrawlManifest
+
+
+COMPLETE = {"race_id": "202544070105", "horses": [{"rank": "1"}], "lap_times": {"interval_times": [12.1]}}
+INCOMPLETE = {"race_id": "202544070106", "horses": [{"rank": "1"}], "lap_times": {}}
+
+
+def write_result(directory, result):
+    with open(directory / f"race_data_{result['race_id']}.json", 'w', encoding='utf-8') as f:
+        json.dump(result, f)
+
+
+def test_json_files_are_checked_and_recorded(tmp_path):
+    write_result(tmp_path, COMPLETE)
+    write_result(tmp_path, INCOMPLETE)
+    manifest = CrawlManifest(str(tmp_path))
+    assert manifest.is_complete("202544070105")
+    assert not manifest.is_complete("202544070106")
+    assert not manifest.is_complete("202544070107")
+    assert manifest.skipped == 1
+
+    lines = (tmp_path / "manifest.jsonl").read_text().splitlines()
+    assert [json.loads(line)["race_id"] for line in lines] == ["202544070105", "202544070106"]
+
+
+def test_entry_without_json_file_is_not_trusted(tmp_path):
+    manifest = CrawlManifest(str(tmp_path))
+    manifest.record(COMPLETE)
+    assert not CrawlManifest(str(tmp_path)).is_complete("202544070105")
+
+
+def test_last_entry_wins_and_partial_line_is_ignored(tmp_path):
+    write_result(tmp_path, COMPLETE)
+    manifest = CrawlManifest(str(tmp_path))
+    manifest.record({**COMPLETE, "lap_times": {}})
+    manifest.record(COMPLETE)
+    with open(tmp_path / "manifest.jsonl", 'a', encoding='utf-8') as f:
+        f.write('{"race_id": "2025')
+    assert CrawlManifest(str(tmp_path)).is_complete("202544070105")
+
+
+def test_stream_manifest_lives_next_to_the_stream(tmp_path):
+    stream = tmp_path / "races.ndjson"
+    manifest = CrawlManifest.for_stream(str(stream))
+    assert manifest.path == str(stream) + ".manifest.jsonl"
+
+    stream.write_text(json.dumps(COMPLETE) + "\n")
+    manifest.record(COMPLETE)
+    manifest.record(INCOMPLETE)
+    resumed = CrawlManifest.for_stream(str(stream))
+    assert resumed.is_complete("202544070105")
+    assert not resumed.is_complete("202544070106")
+    assert not resumed.is_complete("202544070107")
+
+
+def test_stream_ignores_the_directory_manifest(tmp_path):
+    # Entries from an earlier json-mode run say nothing about the stream
+    write_result(tmp_path, COMPLETE)
+    CrawlManifest(str(tmp_path)).record(COMPLETE)
+    stream = tmp_path / "races.ndjson"
+    stream.write_text("")
+    assert not CrawlManifest.for_stream(str(stream)).is_complete("202544070105")
+
+
+def test_emptied_stream_is_scraped_again(tmp_path):
+    stream = tmp_path / "races.ndjson"
+    stream.write_text(json.dumps(COMPLETE) + "\n")
+    CrawlManifest.for_stream(str(stream)).record(COMPLETE)
+    stream.write_text("")
+    assert not CrawlManifest.for_stream(str(stream)).is_complete("202544070105")
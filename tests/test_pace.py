@@ -0,0 +1,48 @@
+import numpy as np
+
+from pace import HIGH, decode_distances, decode_lap_times, decode_times, pace_features
+
+
+def test_decode_times():
+    times = decode_times(["12.3", "1:01.5", "", "abc"])
+    assert times.dtype == np.float32
+    assert np.allclose(times[:2], [12.3, 61.5])
+    assert np.isnan(times[2:]).all()
+
+
+def test_decode_lap_times():
+    distances, cumulative, intervals = decode_lap_times(
+        {"distances": ["200m", "400m", "x"], "cumulative_times": ["12.0", "24.5"], "interval_times": ["12.0", "12.5"]})
+    assert distances.dtype == np.int16
+    assert distances.tolist() == [200, 400, 0]
+    assert np.allclose(cumulative, [12.0, 24.5])
+    assert np.allclose(intervals, [12.0, 12.5])
+    assert [len(values) for values in decode_lap_times({})] == [0, 0, 0]
+    assert decode_distances([]).dtype == np.int16
+
+
+def test_pace_features():
+    distances = np.array([[200, 400, 600, 800], [100, 300, 500, 0], [0, 0, 0, 0]], dtype=np.int16)
+    cumulative = np.array([[11.5, 23.0, 36.0, 49.5], [7.0, 19.0, 31.0, np.nan],
+                           [np.nan] * 4], dtype=np.float32)
+    features = pace_features(distances, cumulative)
+
+    assert features["first_half"][0] == 23.0
+    assert features["second_half"][0] == 26.5
+    assert features["pace_type"][0] == HIGH
+    # Half of 500 m falls inside the 100-300 m lap: 7 + 12 * 150 / 200
+    assert np.isclose(features["first_half"][1], 16.0)
+    assert np.isclose(features["second_half"][1], 15.0)
+    # The short first lap is compared per 200 m (14.0), so the 12.0 laps win
+    assert features["fastest_lap"][1] == 1
+    assert features["fastest_lap_end_m"][1] == 300
+    assert np.isclose(features["fastest_lap_pace"][1], 12.0)
+    # No laps
+    assert features["pace_type"][2] == -1
+    assert features["fastest_lap"][2] == -1
+    assert np.isnan(features["balance"][2])
+
+
+def test_pace_features_without_races():
+    features = pace_features(np.zeros((0, 0), dtype=np.int16), np.zeros((0, 0), dtype=np.float32))
+    assert all(len(values) == 0 for values in features.values())
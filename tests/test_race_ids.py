@@ -0,0 +1,97 @@
+from datetime import date
+
+import pytest
+
+from race_ids import RaceDayTracker, candidate_race_urls, jra_race_ids, nar_race_ids, race_type_of
+
+
+def test_race_type_of():
+    assert race_type_of("202509030611") == "jra"
+    assert race_type_of("202544070105") == "nar"
+
+
+def test_missing_nar_race_ends_only_its_day():
+    tracker = RaceDayTracker()
+    tracker.mark_missing("202544070105")
+    assert tracker.missing == 1
+    assert tracker.is_exhausted("202544070106")
+    assert tracker.is_exhausted("202544070101")
+    assert not tracker.is_exhausted("202544070201")
+    assert not tracker.is_exhausted("202542070101")
+
+
+def test_missing_jra_race_ends_its_day():
+    tracker = RaceDayTracker()
+    tracker.mark_missing("202509030611")
+    assert tracker.is_exhausted("202509030612")
+    assert not tracker.is_exhausted("202509030701")
+
+
+def test_missing_jra_first_race_ends_the_meeting():
+    tracker = RaceDayTracker()
+    tracker.mark_missing("202509030701")
+    assert tracker.is_exhausted("202509030801")
+    assert tracker.is_exhausted("202509031201")
+    assert not tracker.is_exhausted("202509040101")
+    assert not tracker.is_exhausted("202505030801")
+
+
+def test_unknown_date_is_in_range():
+    tracker = RaceDayTracker(date(2025, 6, 1), date(2025, 6, 1))
+    assert tracker.in_range("202509030611", None)
+    assert tracker.out_of_range == 0
+
+
+def test_race_before_the_range_ends_only_its_day():
+    tracker = RaceDayTracker(date(2025, 6, 1), date(2025, 6, 8))
+    assert not tracker.in_range("202509020101", date(2025, 5, 25))
+    assert tracker.out_of_range == 1
+    assert tracker.is_exhausted("202509020102")
+    assert not tracker.is_exhausted("202509020201")
+    assert not tracker.is_exhausted("202509030101")
+
+
+def test_race_after_the_range_ends_the_venues_year():
+    tracker = RaceDayTracker(date(2025, 6, 1), date(2025, 6, 8))
+    assert tracker.in_range("202509030101", date(2025, 6, 1))
+    assert not tracker.in_range("202509030301", date(2025, 6, 14))
+    assert tracker.out_of_range == 1
+    assert tracker.is_exhausted("202509030302")
+    assert tracker.is_exhausted("202509040101")
+    assert not tracker.is_exhausted("202505030301")
+    assert not tracker.is_exhausted("202609010101")
+
+
+def test_nar_race_after_the_range_ends_only_its_day():
+    tracker = RaceDayTracker(date(2025, 7, 1), date(2025, 7, 1))
+    assert not tracker.in_range("202544070205", date(2025, 7, 2))
+    assert tracker.is_exhausted("202544070206")
+    assert not tracker.is_exhausted("202544070301")
+
+
+def test_nar_candidates_skip_exhausted_days():
+    tracker = RaceDayTracker()
+    candidates = []
+    for race_id in nar_race_ids(date(2025, 7, 1), date(2025, 7, 2), ["大井"], tracker):
+        candidates.append(race_id)
+        if race_id == "202544070103":
+            tracker.mark_missing(race_id)
+    assert candidates == ["202544070101", "202544070102", "202544070103"] + [
+        f"2025440702{number:02d}" for number in range(1, 13)]
+
+
+def test_jra_candidates_stop_after_the_range():
+    tracker = RaceDayTracker(date(2025, 6, 1), date(2025, 6, 1))
+    candidates = []
+    for race_id in jra_race_ids(date(2025, 6, 1), date(2025, 6, 1), ["阪神"], tracker):
+        candidates.append(race_id)
+        if race_id == "202509010201":
+            tracker.in_range(race_id, date(2025, 6, 8))
+    assert candidates[0] == "202509010101"
+    assert candidates[-1] == "202509010201"
+    assert len(candidates) == 13
+
+
+def test_candidate_race_urls_rejects_unknown_venues():
+    with pytest.raises(ValueError, match="どこか"):
+        candidate_race_urls(date(2025, 6, 1), date(2025, 6, 1), ["浦和競馬場", "どこか"])
@@ -0,0 +1,49 @@
+import numpy as np
+
+from race_model import Race
+from track_bias import RunnerTable, bias_rows, bias_table, closing_ranks, position_correlation
+
+
+def race(race_id, venue, horses, corner=""):
+    return Race.from_result({
+        "race_id": race_id,
+        "race_info": {"venue": venue, "distance": "ダ1200m", "race_date": "2025/06/01"},
+        "horses": [{"rank": rank, "frame": frame, "horse_number": number, "horse_name": number, "last_3f": last_3f}
+                   for rank, frame, number, last_3f in horses],
+        "corner_passing_order": {"corner_3": corner} if corner else {},
+    })
+
+
+def test_closing_ranks_with_ties():
+    race_index = np.array([0, 0, 0, 0, 1, 1, 1])
+    last_3f = np.array([35.0, 34.5, 35.0, np.nan, 36.0, 36.0, 35.2], dtype=np.float32)
+    assert closing_ranks(race_index, last_3f).tolist() == [2, 1, 2, 0, 2, 2, 1]
+    assert closing_ranks(np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.float32)).tolist() == []
+
+
+def test_bias_table_by_frame():
+    table = RunnerTable.from_races([
+        race("1", "大井", [("1", "1", "1", "36.0"), ("2", "2", "2", "35.5"), ("除外", "3", "3", "")]),
+        race("2", "大井", [("2", "1", "1", "37.0"), ("1", "2", "2", "36.0")]),
+        race("3", "浦和", [("1", "1", "1", "36.5")]),
+    ])
+    rows = bias_rows(bias_table(table, "frame", ["venue"]))
+    assert [(row["venue"], row["frame"], row["starts"], row["wins"]) for row in rows] == [
+        ("大井", 1, 2, 1), ("大井", 2, 2, 1), ("浦和", 1, 1, 1)]
+    # The scratched runner has no finishing position and is left out
+    assert sum(row["starts"] for row in rows) == 5
+
+    only = bias_rows(bias_table(table, "frame", ["venue"], table.mask(venue="浦和")))
+    assert [(row["venue"], row["starts"]) for row in only] == [("浦和", 1)]
+
+
+def test_position_correlation():
+    table = RunnerTable.from_races([
+        race("1", "大井", [("1", "1", "1", "36.0"), ("2", "2", "2", "36.0"), ("3", "3", "3", "36.0")], "1,2,3"),
+        race("2", "浦和", [("1", "1", "1", "36.0"), ("2", "2", "2", "36.0"), ("3", "3", "3", "36.0")], "3,2,1"),
+    ])
+    assert table.columns["early_position"].tolist() == [1, 2, 3, 3, 2, 1]
+    result = position_correlation(table, ["venue"])
+    correlation = dict(zip(result["venue"].tolist(), result["correlation"].tolist()))
+    assert np.isclose(correlation["大井"], 1.0)
+    assert np.isclose(correlation["浦和"], -1.0)
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+import argparse
+import glob
+import os
+import sys
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from pace import PACE_TYPES, lap_matrix, pace_features
+from race_model import Race, corner_matrices, load_races
+from race_store import normalize_venue
+
+
+FACTORS = ("frame", "early_position", "closing_rank")
+GROUP_COLUMNS = ("venue", "distance_m", "surface", "surface_condition", "race_date", "pace_type")
+DEFAULT_GROUP_BY = ("venue", "distance_m", "surface", "race_date")
+
+# Categorical columns are stored as codes into RunnerTable.categories
+CATEGORICAL_COLUMNS = ("venue", "surface", "surface_condition", "pace_type")
+
+
+def early_positions(races: Sequence[Race], race_index: np.ndarray, horse_number: np.ndarray) -> np.ndarray:
+    """
+    Position of each runner at the first recorded corner of its race (1 =
+    leader, 0 if missing from the passing order), for all races at once;
+    ``race_index`` and ``horse_number`` are the RunnerTable columns. Read
+    from the races' corner matrices, which are parsed once and kept.
+    """
+    positions = np.zeros(len(race_index), dtype=np.int8)
+    matrices = corner_matrices(races)
+    if not matrices:
+        return positions
+
+    # First-corner rows of all races side by side (zeros without corners)
+    widths = np.array([matrix.positions.shape[1] for matrix in matrices], dtype=np.intp)
+    first_rows = np.concatenate([matrix.positions[0] if len(matrix.corners) else np.zeros(width, dtype=np.int8)
+                                 for matrix, width in zip(matrices, widths)])
+    offsets = np.concatenate(([0], np.cumsum(widths)[:-1]))
+
+    known = (horse_number >= 1) & (horse_number <= widths[race_index])
+    positions[known] = first_rows[offsets[race_index[known]] + horse_number[known] - 1]
+    return positions
+
+
+def closing_ranks(race_index: np.ndarray, last_3f: np.ndarray) -> np.ndarray:
+    """
+    Rank of each runner's last 3F within its race (1 = fastest, ties share
+    the lower rank, 0 without a time), for all races at once
+    """
+    n = len(last_3f)
+    ranks = np.zeros(n, dtype=np.int8)
+    if not n:
+        return ranks
+
+    order = np.lexsort((last_3f, race_index))
+    races = race_index[order]
+    times = last_3f[order]
+    positions = np.arange(n)
+
+    new_race = np.ones(n, dtype=bool)
+    new_race[1:] = races[1:] != races[:-1]
+    new_value = new_race.copy()
+    new_value[1:] |= times[1:] != times[:-1]
+
+    race_start = np.maximum.accumulate(np.where(new_race, positions, 0))
+    tie_start = np.maximum.accumulate(np.where(new_value, positions, 0))
+    ranks[order] = tie_start - race_start + 1
+    ranks[np.isnan(last_3f)] = 0
+    return ranks
+
+
+@dataclass(slots=True)
+class RunnerTable:
+    """
+    All runners of many races as flat columns, one element per runner
+
+    Race-level columns (venue, distance_m, ...) are repeated per runner so
+    every aggregate is a single grouped reduction over the whole table.
+    """
+    columns: Dict[str, np.ndarray]
+    categories: Dict[str, List[Optional[str]]]
+
+    def __len__(self) -> int:
+        return len(self.columns["rank"])
+
+    @classmethod
+    def from_races(cls, races: Sequence[Race]) -> "RunnerTable":
+        categories: Dict[str, List[Optional[str]]] = {column: [] for column in CATEGORICAL_COLUMNS}
+        codes: Dict[str, Dict[Optional[str], int]] = {column: {} for column in CATEGORICAL_COLUMNS}
+
+        def code(column: str, value: Optional[str]) -> int:
+            if value not in codes[column]:
+                codes[column][value] = len(categories[column])
+                categories[column].append(value)
+            return codes[column][value]
+
+        sizes = np.array([len(race.runners) for race in races], dtype=np.int32)
+        race_columns = {
+            "venue": np.array([code("venue", race.venue) for race in races], dtype=np.int16),
+            "surface": np.array([code("surface", race.surface) for race in races], dtype=np.int16),
+            "surface_condition": np.array([code("surface_condition", race.surface_condition) for race in races],
+                                          dtype=np.int16),
+            "distance_m": np.array([race.distance_m or 0 for race in races], dtype=np.int16),
+            "race_date": np.array([race.race_date or "NaT" for race in races], dtype="datetime64[D]"),
+        }
+
+        # Pace types are fixed categories; races without laps get the trailing None
+        pace_type = pace_features(*lap_matrix(races))["pace_type"].astype(np.int16)
+        race_columns["pace_type"] = np.where(pace_type < 0, len(PACE_TYPES), pace_type)
+        categories["pace_type"] = list(PACE_TYPES) + [None]
+
+        def runner_column(name: str, dtype) -> np.ndarray:
+            if not races:
+                return np.zeros(0, dtype=dtype)
+            return np.concatenate([getattr(race.runners, name) for race in races]).astype(dtype, copy=False)
+
+        columns = {name: np.repeat(values, sizes) for name, values in race_columns.items()}
+        columns["race"] = np.repeat(np.arange(len(races), dtype=np.int32), sizes)
+        columns["rank"] = runner_column("rank", np.int8)
+        columns["frame"] = runner_column("frame", np.int8)
+        columns["horse_number"] = runner_column("horse_number", np.int8)
+        columns["last_3f"] = runner_column("last_3f", np.float32)
+        columns["early_position"] = early_positions(races, columns["race"], columns["horse_number"])
+        columns["closing_rank"] = closing_ranks(columns["race"], columns["last_3f"])
+        return cls(columns, categories)
+
+    def mask(self, venue: Optional[str] = None, distance_m: Optional[int] = None,
+             surface: Optional[str] = None, surface_condition: Optional[str] = None,
+             since: Optional[date] = None, until: Optional[date] = None,
+             pace_type: Optional[str] = None) -> np.ndarray:
+        """Boolean row mask for the given filters (None = any)"""
+        mask = np.ones(len(self), dtype=bool)
+        for column, value in [("venue", venue), ("surface", surface), ("surface_condition", surface_condition),
+                              ("pace_type", pace_type)]:
+            if value is not None:
+                values = self.categories[column]
+                mask &= self.columns[column] == (values.index(value) if value in values else -1)
+        if distance_m is not None:
+            mask &= self.columns["distance_m"] == distance_m
+        if since is not None:
+            mask &= self.columns["race_date"] >= np.datetime64(since, "D")
+        if until is not None:
+            mask &= self.columns["race_date"] <= np.datetime64(until, "D")
+        return mask
+
+
+def check_arguments(factor: str, group_by: Sequence[str]) -> None:
+    if factor not in FACTORS:
+        raise ValueError(f"Unknown factor {factor!r}, expected one of {', '.join(FACTORS)}")
+    for column in group_by:
+        if column not in GROUP_COLUMNS:
+            raise ValueError(f"Cannot group by {column!r}, expected any of {', '.join(GROUP_COLUMNS)}")
+
+
+def group_keys(columns: Dict[str, np.ndarray], key_columns: Sequence[str], valid: np.ndarray):
+    """
+    Group the valid rows by ``key_columns``
+
+    Returns (unique values per column, key codes per group and column, group
+    index per valid row). Each column is factorized on its own and the codes
+    are combined into one integer key, which is far cheaper than
+    np.unique(axis=0) over stacked rows.
+    """
+    uniques, codes = zip(*(np.unique(columns[column][valid], return_inverse=True) for column in key_columns))
+    shape = tuple(max(len(values), 1) for values in uniques)
+    combined = np.ravel_multi_index([code.reshape(-1) for code in codes], shape) if codes[0].size else codes[0]
+    keys, inverse = np.unique(combined, return_inverse=True)
+    return uniques, np.unravel_index(keys, shape), inverse.reshape(-1)
+
+
+def decode_keys(table: RunnerTable, key_columns: Sequence[str], uniques, key_codes) -> Dict[str, np.ndarray]:
+    """Key columns of each group, with categorical codes turned back into values"""
+    result: Dict[str, np.ndarray] = {}
+    for column, values, code in zip(key_columns, uniques, key_codes):
+        values = values[code]
+        if column in CATEGORICAL_COLUMNS:
+            values = np.array(table.categories[column], dtype=object)[values]
+        result[column] = values
+    return result
+
+
+def bias_table(table: RunnerTable, factor: str, group_by: Sequence[str] = DEFAULT_GROUP_BY,
+               mask: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+    """
+    Starts, wins and win/top-3 rates per group and factor value
+
+    ``factor`` is one of FACTORS; ``group_by`` is any subset of
+    GROUP_COLUMNS (e.g. drop race_date to aggregate over a whole period).
+    Runners without a finishing position or a factor value are left out.
+    Returns columns: the group_by columns (decoded), the factor, starts,
+    wins, top3, win_rate and top3_rate, ordered by group then factor.
+    """
+    check_arguments(factor, group_by)
+    columns = table.columns
+    valid = (columns["rank"] > 0) & (columns[factor] > 0)
+    if mask is not None:
+        valid &= mask
+
+    key_columns = list(group_by) + [factor]
+    uniques, key_codes, inverse = group_keys(columns, key_columns, valid)
+    size = len(key_codes[0])
+
+    rank = columns["rank"][valid]
+    starts = np.bincount(inverse, minlength=size)
+    wins = np.bincount(inverse, weights=rank == 1, minlength=size).astype(np.int64)
+    top3 = np.bincount(inverse, weights=rank <= 3, minlength=size).astype(np.int64)
+
+    result = decode_keys(table, key_columns, uniques, key_codes)
+    result["starts"] = starts
+    result["wins"] = wins
+    result["top3"] = top3
+    with np.errstate(invalid="ignore", divide="ignore"):
+        result["win_rate"] = wins / starts
+        result["top3_rate"] = top3 / starts
+    return result
+
+
+def position_correlation(table: RunnerTable, group_by: Sequence[str] = DEFAULT_GROUP_BY,
+                         mask: Optional[np.ndarray] = None, factor: str = "early_position") -> Dict[str, np.ndarray]:
+    """
+    Correlation between ``factor`` (early position by default) and finishing
+    rank per group, with the number of runners it is based on
+
+    Near +1 means horses that were in front early also finished in front
+    (a front-runner bias); near 0 or negative favours closers.
+    """
+    check_arguments(factor, group_by)
+    if not group_by:
+        raise ValueError("Need at least one column to group by")
+
+    columns = table.columns
+    valid = (columns["rank"] > 0) & (columns[factor] > 0)
+    if mask is not None:
+        valid &= mask
+
+    uniques, key_codes, inverse = group_keys(columns, group_by, valid)
+    size = len(key_codes[0])
+    x = columns[factor][valid].astype(np.float64)
+    y = columns["rank"][valid].astype(np.float64)
+
+    def total(values):
+        return np.bincount(inverse, weights=values, minlength=size)
+
+    n = np.bincount(inverse, minlength=size)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        covariance = total(x * y) - total(x) * total(y) / n
+        spread = np.sqrt((total(x * x) - total(x) ** 2 / n) * (total(y * y) - total(y) ** 2 / n))
+        correlation = covariance / spread
+
+    result = decode_keys(table, group_by, uniques, key_codes)
+    result["runners"] = n
+    result["correlation"] = correlation
+    return result
+
+
+def bias_rows(bias: Dict[str, np.ndarray]) -> List[Dict[str, Any]]:
+    """Row-wise view of a bias_table() result"""
+    names = list(bias)
+    return [dict(zip(names, values)) for values in zip(*(bias[name].tolist() for name in names))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Track bias by frame, early position or closing speed")
+    parser.add_argument('output_dir', nargs='?', default="output", help="directory of race_data_*.json files")
+    parser.add_argument('--factor', choices=FACTORS, default="frame")
+    parser.add_argument('--by', default=",".join(DEFAULT_GROUP_BY),
+                        help=f"comma-separated group columns out of {','.join(GROUP_COLUMNS)} "
+                             f"(default: {','.join(DEFAULT_GROUP_BY)})")
+    parser.add_argument('--venue', help="e.g. 浦和")
+    parser.add_argument('--distance', type=int, help="distance in metres, e.g. 1500")
+    parser.add_argument('--surface', choices=["ダ", "芝", "障"])
+    parser.add_argument('--surface-condition', help="e.g. 良, 稍重, 重, 不良")
+    parser.add_argument('--pace', choices=PACE_TYPES, help="only races of this pace type")
+    parser.add_argument('--since', type=date.fromisoformat, metavar='YYYY-MM-DD')
+    parser.add_argument('--until', type=date.fromisoformat, metavar='YYYY-MM-DD')
+    parser.add_argument('--from-archive', action='store_true',
+                        help="read the race_data_*.html.gz archives (scraper.py --archive) instead of the JSON files")
+    args = parser.parse_args()
+
+    group_by = [column for column in args.by.split(",") if column]
+    if args.from_archive:
+        # The scraper (and its browser/HTTP dependencies) is only needed for HTML
+        from scraper import load_archived_races
+        races = load_archived_races(args.output_dir)
+    else:
+        races = load_races(sorted(glob.glob(os.path.join(args.output_dir, "race_data_*.json"))))
+    table = RunnerTable.from_races(races)
+    try:
+        bias = bias_table(table, args.factor, group_by, table.mask(
+            venue=normalize_venue(args.venue) if args.venue else None, distance_m=args.distance,
+            surface=args.surface, surface_condition=args.surface_condition, since=args.since, until=args.until,
+            pace_type=args.pace))
+    except ValueError as e:
+        parser.error(str(e))
+
+    rows = bias_rows(bias)
+    if not rows:
+        print("No races found")
+        sys.exit(1)
+
+    print("\t".join(group_by + [args.factor, "starts", "wins", "top3", "win_rate", "top3_rate"]))
+    for row in rows:
+        print("\t".join([str(row[column]) for column in group_by + [args.factor, "starts", "wins", "top3"]]
+                        + [f"{row['win_rate']:.1%}", f"{row['top3_rate']:.1%}"]))
+
+
+if __name__ == "__main__":
+    main()